@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+def is_server_process() -> bool:
+    """
+    Tells whether this process serves requests, as opposed to a one-off
+    manage.py command. runserver loads the apps twice: once in the
+    autoreloader and once in the child that actually serves (RUN_MAIN).
+    """
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    if len(sys.argv) > 1 and sys.argv[1] == 'runserver':
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return False
+
+
+class PeriodicJob(threading.Thread):
+    """
+    Daemon thread running func every interval seconds until stopped.
+    """
+
+    def __init__(self, name: str, interval: float, func):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.func = func
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Background job %s failed", self.name)
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_periodic_job(name: str, interval: float, func):
+    """
+    Starts func as a PeriodicJob when running inside the server.
+    :param interval: seconds between runs, a falsy value disables the job
+    :return: the started job or None
+    """
+    if not interval or not is_server_process():
+        return None
+    job = PeriodicJob(name, interval, func)
+    job.start()
+    return job
+
+
+@contextmanager
+def exclusive(name: str):
+    """
+    Holds the Postgres session advisory lock called name for the duration
+    of the block, so work guarded by it runs in one process at a time
+    however many server processes and commands share the database.
+    :yield: True if this process got the lock, False if another one holds it
+    """
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+    key = int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
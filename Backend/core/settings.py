@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -176,8 +177,75 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.VersionedTokenObtainPairSerializer',
 }
 
+# In-process access token revocation list (see users/revocation.py)
+REVOCATION_BLOOM_CAPACITY = 100_000  # expected number of unexpired revoked tokens
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+REVOCATION_CACHE_SIZE = 10_000
+REVOCATION_SYNC_INTERVAL = 5  # seconds between incremental syncs with the database
+REVOCATION_REBUILD_INTERVAL = 60 * 10  # full rebuild in the background, drops expired jtis
+
+# In-memory leaderboard (see users/leaderboard.py)
+LEADERBOARD_REBUILD_INTERVAL = 60 * 5  # seconds, background rebuild picking up stats changed by other processes
+
+# Periodic deletion of expired token rows (see users/compaction.py)
+TOKEN_COMPACTION_INTERVAL = 60 * 15  # seconds, 0 disables the in-process job
+TOKEN_COMPACTION_BATCH_SIZE = 1000
+TOKEN_COMPACTION_MAX_BATCHES = 10  # per table and run, the rest waits for the next run
+
+# Background writer of queued tournaments (see tournaments/submitter.py)
+TOURNAMENT_SUBMITTER_INTERVAL = 2  # seconds, 0 disables the in-process job
+TOURNAMENT_SUBMITTER_BATCH_SIZE = 20  # transactions sent per cycle
+TOURNAMENT_SUBMITTER_BATCH_WINDOW = 4  # seconds a due submission may wait for its batch to fill up
+TOURNAMENT_SUBMITTER_MAX_ATTEMPTS = 5
+TOURNAMENT_SUBMITTER_BACKOFF = 5  # seconds before the first retry, doubled on every further attempt
+TOURNAMENT_SUBMITTER_MAX_BACKOFF = 60 * 5
+TOURNAMENT_SUBMITTER_RECOVERY_BLOCKS = 1000  # blocks searched for a sent transaction whose hash was not recorded
+
+# Hashes of the inputs of `manage.py bootstrap` steps, written at runtime
+# outside the source packages (see tournaments/management/commands/bootstrap.py)
+BOOTSTRAP_STATE_PATH = os.environ.get('BOOTSTRAP_STATE_PATH', os.path.join(BASE_DIR, 'data', 'bootstrap_state.json'))
+
+# Where tournaments are stored (see tournaments/storage.py): ChainStorage,
+# DatabaseStorage, or MemoryStorage for benchmarks and tests. The submitter
+# and indexer jobs only run with ChainStorage.
+TOURNAMENT_STORAGE_BACKEND = os.environ.get('TOURNAMENT_STORAGE_BACKEND', 'tournaments.storage.ChainStorage')
+
+# With ChainStorage, "contract" stores every match in the contract, "merkle" keeps the matches in
+# the database and only commits their Merkle root on chain (see tournaments/merkle.py)
+TOURNAMENT_STORAGE_MODE = os.environ.get('TOURNAMENT_STORAGE_MODE', 'contract')
+TOURNAMENT_ROOT_CACHE_SIZE = 1000  # committed roots read back from the chain for match proofs
+TOURNAMENT_ROOT_CACHE_TTL = 60 * 60  # seconds
+
+# Off-chain copy of the contract's tournaments (see tournaments/indexer.py)
+TOURNAMENT_INDEXER_INTERVAL = 2  # seconds, 0 disables the in-process job
+TOURNAMENT_INDEXER_CHUNK_SIZE = 500  # blocks per transaction
+TOURNAMENT_INDEXER_CONFIRMATIONS = 0  # blocks to stay behind the head
+
+# Per-name cache of tournaments read from the chain (see tournaments/block.py)
+TOURNAMENT_CACHE_SIZE = 1000
+TOURNAMENT_CACHE_TTL = 30  # seconds an entry is served without refreshing
+TOURNAMENT_CACHE_STALE_TTL = 60 * 10  # seconds a stale entry may be served while the node is slow or down
+TOURNAMENT_BATCH_READ_SIZE = 50  # contract calls per JSON-RPC batch request
+
+# Buffered bulk indexing of users into Elasticsearch (see elk/bulk.py)
+ELK_BUFFER_SIZE = 10_000  # users waiting to be indexed, the oldest change is dropped beyond that
+ELK_FLUSH_SIZE = 500  # documents per bulk request, a full batch is shipped right away
+ELK_FLUSH_INTERVAL = 1.0  # seconds between flushes
+ELK_MAX_RETRIES = 3
+
+# Elasticsearch connection (see elk/elasticsearch_client.py), made on first use
+ELK_CONNECT_TIMEOUT = 2  # seconds the first ping and the re-probes wait
+ELK_BREAKER_THRESHOLD = 3  # connection errors in a row before requests are paused
+ELK_REPROBE_INTERVAL = 5  # seconds before the first re-probe, doubled up to ELK_REPROBE_MAX_INTERVAL
+ELK_REPROBE_MAX_INTERVAL = 60
+
+# Player search (see elk/search.py)
+ELK_SEARCH_CACHE_SIZE = 1000  # distinct queries kept
+ELK_SEARCH_CACHE_TTL = 10  # seconds a result is served from the cache
+
 # Media settings for uploaded files to be stored in media directory which is mounted to /media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -0,0 +1,233 @@
+"""
+Buffered bulk indexing of users into Elasticsearch.
+
+Signal handlers only enqueue the id of a changed user once its transaction
+has committed. The buffer is bounded and keyed by user id, so any number of
+saves of the same user before the next flush cost one document. A flusher
+thread ships the buffer with the bulk API when it holds ELK_FLUSH_SIZE users
+or ELK_FLUSH_INTERVAL seconds after the first enqueue, reading the users of
+a batch with a single query. Before its first batch it creates the users
+index with its mappings if it does not exist yet. Failed documents are
+retried up to ELK_MAX_RETRIES times. While Elasticsearch is unavailable
+nothing is shipped and the buffer waits for it to come back.
+
+Unchanged documents are not sent: the hash of each indexed document is
+stored in User.search_hash, and a user whose document hashes the same is
+skipped. The hash lives in the database, so every process compares against
+what any of them indexed last. A user enqueued only because their stats
+changed is sent as a partial update carrying every stats field, which
+clears the stored hash since the rest of the indexed document is then not
+known; any other change, or a partial update that finds no document, sends
+the whole document. If the users index is created anew, all hashes are
+cleared.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from elasticsearch import helpers
+
+from elk.elasticsearch_client import es
+from elk.indices import USERS_INDEX, document_hash, ensure_index, user_document
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = getattr(settings, 'ELK_BUFFER_SIZE', 10_000)
+FLUSH_SIZE = getattr(settings, 'ELK_FLUSH_SIZE', 500)
+FLUSH_INTERVAL = getattr(settings, 'ELK_FLUSH_INTERVAL', 1.0)
+MAX_RETRIES = getattr(settings, 'ELK_MAX_RETRIES', 3)
+
+STATS_FIELDS = ('total_games', 'wins', 'losses', 'win_rate', 'rank')
+
+# Keys of user_document
+INDEXED_FIELDS = (
+    'username', 'email', 'first_name', 'last_name', 'profile_image', 'intra_id', 'intra_login',
+    'is_oauth_user', 'is_two_factor_enabled', 'total_games', 'wins', 'losses', 'win_rate', 'rank',
+)
+
+
+class BulkIndexer:
+    """
+    Bounded, coalescing buffer of user ids with a background flusher.
+    """
+
+    def __init__(self, maxsize=BUFFER_SIZE, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = OrderedDict()  # user id -> (attempts so far, only the stats changed)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._index_ready = False
+        self.counters = {
+            'enqueued': 0, 'coalesced': 0, 'indexed': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0,
+            'batches': 0, 'retried': 0, 'dropped': 0, 'backpressure': 0, 'errors': 0,
+        }
+
+    def enqueue(self, user_id, stats_only: bool = False):
+        """
+        Schedules the user's document to be (re)indexed, or deleted if the
+        user no longer exists at flush time.
+        :param stats_only: only STATS_FIELDS changed, a partial update will do
+        """
+        with self._lock:
+            self.counters['enqueued'] += 1
+            if user_id in self._pending:
+                self._pending[user_id] = (0, stats_only and self._pending[user_id][1])
+                self.counters['coalesced'] += 1
+                return
+            if len(self._pending) >= self.maxsize:
+                # Full: drop the oldest change, the newest is the most useful
+                self._pending.popitem(last=False)
+                self.counters['dropped'] += 1
+            self._pending[user_id] = (0, stats_only)
+            if len(self._pending) >= self.flush_size:
+                self.counters['backpressure'] += 1
+                self._wakeup.notify()
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='elk-bulk-indexer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            available = es.available
+            with self._lock:
+                if len(self._pending) < self.flush_size or not available:
+                    self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Elasticsearch bulk flush failed")
+            finally:
+                close_old_connections()
+
+    def _take(self, limit):
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < limit:
+                batch.append(self._pending.popitem(last=False))
+            return batch
+
+    def _requeue(self, user_id, attempts, stats_only):
+        with self._lock:
+            if user_id in self._pending:
+                # Changed again meanwhile, the new entry covers the stats; keep a full reindex
+                self._pending[user_id] = (self._pending[user_id][0], stats_only and self._pending[user_id][1])
+                return
+            if attempts >= MAX_RETRIES or len(self._pending) >= self.maxsize:
+                self.counters['dropped'] += 1
+                return
+            self._pending[user_id] = (attempts, stats_only)
+            self.counters['retried'] += 1
+
+    def flush(self):
+        """
+        Ships everything buffered so far, in batches of flush_size, as long
+        as Elasticsearch is available.
+        """
+        with self._flush_lock:
+            while es.available:
+                batch = self._take(self.flush_size)
+                if not batch:
+                    return
+                self._ship(dict(batch))
+
+    def _actions(self, batch, users):
+        """
+        :param batch: user id -> (attempts, stats_only)
+        :param users: user id -> user, for the users that still exist
+        :return: (bulk actions, user id -> search_hash to store once indexed)
+        """
+        actions = []
+        hashes = {}
+        for user_id, (_, stats_only) in batch.items():
+            user = users.get(user_id)
+            if user is None:
+                actions.append({'_op_type': 'delete', '_index': USERS_INDEX, '_id': user_id})
+                continue
+            document = user_document(user)
+            content_hash = document_hash(document)
+            if content_hash == user.search_hash:
+                continue
+            if stats_only:
+                doc = {field: document[field] for field in STATS_FIELDS}
+                actions.append({'_op_type': 'update', '_index': USERS_INDEX, '_id': user_id, 'doc': doc})
+                hashes[user_id] = None
+            else:
+                actions.append({'_op_type': 'index', '_index': USERS_INDEX, '_id': user_id, '_source': document})
+                hashes[user_id] = content_hash
+        return actions, hashes
+
+    def _ship(self, batch):
+        started = time.monotonic()
+        User = get_user_model()
+        try:
+            if not self._index_ready:
+                if ensure_index(es, USERS_INDEX):
+                    # A new, empty index holds none of the documents the hashes stand for
+                    User.objects.exclude(search_hash=None).update(search_hash=None)
+                self._index_ready = True
+            users = User.objects.in_bulk(list(batch))
+            actions, hashes = self._actions(batch, users)
+            errors = helpers.bulk(es, actions, raise_on_error=False)[1] if actions else []
+        except Exception as e:
+            # TransportError when ES is down, anything else must not lose the batch either
+            logger.warning("Elasticsearch bulk request of %d documents failed: %s", len(batch), e)
+            with self._lock:
+                self.counters['errors'] += 1
+            for user_id, (tries, stats_only) in batch.items():
+                self._requeue(user_id, tries + 1, stats_only)
+            return
+        failed = set()
+        for error in errors:
+            op_type, item = next(iter(error.items()))
+            if op_type == 'delete' and item.get('status') == 404:
+                continue
+            user_id = int(item['_id'])
+            failed.add(user_id)
+            # Send the whole document next time, e.g. if a partial update found no document
+            self._requeue(user_id, batch[user_id][0] + 1, stats_only=False)
+        indexed = []
+        for user_id, content_hash in hashes.items():
+            if user_id not in failed:
+                users[user_id].search_hash = content_hash
+                indexed.append(users[user_id])
+        # bulk_update sends no post_save, which would enqueue the users again
+        User.objects.bulk_update(indexed, ['search_hash'])
+        counter = {'index': 'indexed', 'update': 'updated', 'delete': 'deleted'}
+        with self._lock:
+            self.counters['batches'] += bool(actions)
+            self.counters['errors'] += len(failed)
+            self.counters['unchanged'] += len(batch) - len(actions)
+            for action in actions:
+                if action['_id'] not in failed:
+                    self.counters[counter[action['_op_type']]] += 1
+        logger.debug("Shipped %d documents to Elasticsearch in %.3fs", len(actions), time.monotonic() - started)
+
+    def flush_at_exit(self):
+        # Most processes never buffer anything, they should not connect to Elasticsearch just to exit
+        if self._pending:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {'buffered': len(self._pending), **self.counters}
+
+
+bulk_indexer = BulkIndexer()
+
+# Short-lived processes (manage.py commands) ship what they buffered before exiting
+atexit.register(bulk_indexer.flush_at_exit)
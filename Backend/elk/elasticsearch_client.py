@@ -1,20 +1,90 @@
+"""
+Elasticsearch client shared by the elk app.
+
+`es` connects lazily: importing this module costs nothing, the first use
+pings the cluster once with a short timeout. While the cluster is
+unreachable, or after ELK_BREAKER_THRESHOLD connection errors in a row,
+calls raise ConnectionError without a request and a background thread
+re-probes with a growing interval until the cluster answers again. Callers
+check `es.available` before doing work that is pointless without
+Elasticsearch.
+"""
 from elasticsearch import Elasticsearch
+from elasticsearch.client.utils import NamespacedClient
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout
+from django.conf import settings
 import os
+import threading
 import time
 import logging
-from urllib3.exceptions import NewConnectionError, MaxRetryError
 
 logger = logging.getLogger(__name__)
 
 ELASTICSEARCH_HOSTS = os.environ.get("ELASTICSEARCH_HOSTS")
+CONNECT_TIMEOUT = getattr(settings, 'ELK_CONNECT_TIMEOUT', 2)
+BREAKER_THRESHOLD = getattr(settings, 'ELK_BREAKER_THRESHOLD', 3)
+REPROBE_INTERVAL = getattr(settings, 'ELK_REPROBE_INTERVAL', 5)
+REPROBE_MAX_INTERVAL = getattr(settings, 'ELK_REPROBE_MAX_INTERVAL', 60)
 
-# Define a connection with retry logic
-def get_elasticsearch_client(max_retries=5, retry_interval=2):
-    retries = 0
-    while retries < max_retries:
-        try:
-            client = Elasticsearch(
-                hosts=[ELASTICSEARCH_HOSTS],
+# LazyElasticsearchClient states
+UNTRIED = 'untried'
+CONNECTED = 'connected'
+OPEN = 'open'  # breaker open, calls raise ConnectionError
+DISABLED = 'disabled'  # no ELASTICSEARCH_HOSTS configured
+
+
+class TrackedNamespace:
+    """
+    Namespace of the client (indices, cluster...) whose requests go
+    through the breaker like the client's own.
+    """
+
+    def __init__(self, owner, namespace):
+        self._owner = owner
+        self._namespace = namespace
+
+    def __getattr__(self, name):
+        attribute = getattr(self._namespace, name)
+        return self._owner._tracked(attribute) if callable(attribute) else attribute
+
+
+class LazyElasticsearchClient:
+    """
+    Proxy to an Elasticsearch client that raises ConnectionError while the
+    cluster is unreachable.
+    """
+
+    def __init__(self, hosts=ELASTICSEARCH_HOSTS):
+        self._hosts = hosts
+        self._client = None
+        self._lock = threading.Lock()
+        self._state = UNTRIED
+        self._failures = 0
+        self._probe_thread = None
+
+    @property
+    def available(self) -> bool:
+        """
+        True if calls reach Elasticsearch, connects on the first check.
+        """
+        if self._state == UNTRIED:
+            self._connect()
+        return self._state == CONNECTED
+
+    def status(self) -> dict:
+        return {'state': self._state, 'consecutive_failures': self._failures}
+
+    def _connect(self):
+        with self._lock:
+            if self._state != UNTRIED:
+                return
+            if not self._hosts:
+                logger.warning("ELASTICSEARCH_HOSTS is not set, Elasticsearch is disabled")
+                self._state = DISABLED
+                return
+            # Creating the client does not touch the network
+            self._client = Elasticsearch(
+                hosts=[self._hosts],
                 verify_certs=False,  # For local dev/self-signed certs
                 ssl_show_warn=False,
                 headers={"Accept": "application/json", "Content-Type": "application/json"},
@@ -22,31 +92,70 @@ def get_elasticsearch_client(max_retries=5, retry_interval=2):
                 max_retries=3,
                 request_timeout=10
             )
-            # Ping to verify connection
-            if client.ping():
-                logger.info(f"Successfully connected to Elasticsearch at {ELASTICSEARCH_HOSTS}")
-                return client
-        except (ConnectionError, NewConnectionError, MaxRetryError) as e:
-            retries += 1
-            if retries < max_retries:
-                logger.warning(f"Connection to Elasticsearch failed (attempt {retries}/{max_retries}): {str(e)}")
-                time.sleep(retry_interval)
+            if self._ping():
+                logger.info(f"Successfully connected to Elasticsearch at {self._hosts}")
+                self._state = CONNECTED
             else:
-                logger.error(f"Failed to connect to Elasticsearch after {max_retries} attempts: {str(e)}")
-        except Exception as e:
-            logger.error(f"Unexpected error connecting to Elasticsearch: {str(e)}")
-            break
-    
-    # Return None or a dummy client that gracefully handles failures
-    return DummyElasticsearchClient()
-
-# Dummy client that silently handles errors when Elasticsearch is unavailable
-class DummyElasticsearchClient:
-    """A fallback client that absorbs errors when Elasticsearch is unavailable"""
+                logger.warning(f"Elasticsearch at {self._hosts} is not reachable, retrying in the background")
+                self._open()
+
+    def _ping(self) -> bool:
+        try:
+            return bool(self._client.ping(request_timeout=CONNECT_TIMEOUT))
+        except Exception:
+            return False
+
+    def _open(self):
+        # Called with self._lock held
+        self._state = OPEN
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(target=self._reprobe, name='elasticsearch-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _reprobe(self):
+        interval = REPROBE_INTERVAL
+        while True:
+            time.sleep(interval)
+            if self._ping():
+                with self._lock:
+                    self._state = CONNECTED
+                    self._failures = 0
+                logger.info(f"Elasticsearch at {self._hosts} is reachable again")
+                return
+            interval = min(interval * 2, REPROBE_MAX_INTERVAL)
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == CONNECTED and self._failures >= BREAKER_THRESHOLD:
+                logger.warning(f"{self._failures} Elasticsearch requests in a row failed, pausing until it answers again")
+                self._open()
+
+    def _check_available(self):
+        if not self.available:
+            raise ConnectionError('N/A', f"Elasticsearch is unavailable ({self._state})", None)
+
+    def _tracked(self, method):
+        def call(*args, **kwargs):
+            # Checked per call, a namespace or method may be kept across a breaker trip
+            self._check_available()
+            try:
+                result = method(*args, **kwargs)
+            except (ConnectionError, ConnectionTimeout):
+                self._record_failure()
+                raise
+            with self._lock:
+                self._failures = 0
+            return result
+        return call
+
     def __getattr__(self, name):
-        def dummy_method(*args, **kwargs):
-            return None
-        return dummy_method
+        self._check_available()
+        attribute = getattr(self._client, name)
+        if isinstance(attribute, NamespacedClient):
+            return TrackedNamespace(self, attribute)
+        # Requests are methods of the client, the transport is passed through
+        return self._tracked(attribute) if callable(attribute) else attribute
+
 
-# Try to get a real client, fall back to dummy if it fails
-es = get_elasticsearch_client()
+es = LazyElasticsearchClient()
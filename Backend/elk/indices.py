@@ -0,0 +1,140 @@
+"""
+Elasticsearch indices and the documents stored in them.
+
+USERS_INDEX and MATCHES_INDEX are the names clients read and write. After a
+full rebuild (`python manage.py reindex`) they are aliases of versioned
+indices such as users-20260101120000; until then "users" may still be the
+concrete index created, with USERS_MAPPINGS, before the first bulk request
+(see ensure_index).
+"""
+import hashlib
+import json
+
+from django.utils import timezone
+
+USERS_INDEX = 'users'
+MATCHES_INDEX = 'matches'
+
+USERS_MAPPINGS = {
+    "properties": {
+        "username": {"type": "search_as_you_type"},
+        "email": {"type": "keyword"},
+        "first_name": {"type": "text"},
+        "last_name": {"type": "text"},
+        "profile_image": {"type": "keyword", "index": False},
+        "intra_id": {"type": "keyword"},
+        "intra_login": {"type": "keyword"},
+        "is_oauth_user": {"type": "boolean"},
+        "is_two_factor_enabled": {"type": "boolean"},
+        "total_games": {"type": "integer"},
+        "wins": {"type": "integer"},
+        "losses": {"type": "integer"},
+        "win_rate": {"type": "float"},
+        "rank": {"type": "keyword"},
+    }
+}
+
+MATCHES_MAPPINGS = {
+    "properties": {
+        "player1Name": {"type": "keyword"},
+        "player2Name": {"type": "keyword"},
+        "player1Score": {"type": "integer"},
+        "player2Score": {"type": "integer"},
+        "matchType": {"type": "keyword"},
+        "winner": {"type": "keyword"},
+        "player1_user": {"type": "long"},
+        "player2_user": {"type": "long"},
+        "winner_user": {"type": "long"},
+        "created_at": {"type": "date"},
+    }
+}
+
+MAPPINGS = {USERS_INDEX: USERS_MAPPINGS, MATCHES_INDEX: MATCHES_MAPPINGS}
+
+
+def user_document(user) -> dict:
+    """
+    :return: the document indexed for a user
+    """
+    return {
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "profile_image": user.profile_image,
+        "intra_id": user.intra_id,
+        "intra_login": user.intra_login,
+        "is_oauth_user": user.is_oauth_user,
+        "is_two_factor_enabled": user.is_two_factor_enabled,
+        "total_games": user.total_games,
+        "wins": user.wins,
+        "losses": user.losses,
+        "win_rate": user.win_rate,
+        "rank": user.rank,
+    }
+
+
+def document_hash(document: dict) -> str:
+    """
+    :return: hash of a document's content, stored as User.search_hash once
+             the document is indexed
+    """
+    return hashlib.blake2b(json.dumps(document, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+def match_document(match) -> dict:
+    """
+    :return: the document indexed for a match
+    """
+    return {
+        "player1Name": match.player1Name,
+        "player2Name": match.player2Name,
+        "player1Score": match.player1Score,
+        "player2Score": match.player2Score,
+        "matchType": match.matchType,
+        "winner": match.winner,
+        "player1_user": match.player1_user_id,
+        "player2_user": match.player2_user_id,
+        "winner_user": match.winner_user_id,
+        "created_at": match.created_at.isoformat() if match.created_at else None,
+    }
+
+
+def ensure_index(client, alias: str) -> bool:
+    """
+    Creates the concrete index alias with its mappings unless an index or an
+    alias of that name already exists, so that documents written before the
+    first reindex are not mapped dynamically (rank would become a text field).
+    :return: True if this call created the index
+    """
+    if client.indices.exists(index=alias):
+        return False
+    # 400 is resource_already_exists_exception, when another process created it first
+    response = client.indices.create(index=alias, body={"mappings": MAPPINGS[alias]}, ignore=[400])
+    return bool(response.get('acknowledged'))
+
+
+def versioned_name(alias: str) -> str:
+    """
+    :return: name of a new index behind alias, e.g. users-20260101120000
+    """
+    return f"{alias}-{timezone.now():%Y%m%d%H%M%S}"
+
+
+def swap_alias(client, alias: str, index: str) -> list:
+    """
+    Points alias at index in one atomic update_aliases call. A concrete index
+    named like the alias, left from before aliases were used, is removed in
+    the same call.
+    :return: names of the indices the alias pointed at before
+    """
+    actions = []
+    previous = []
+    if client.indices.exists_alias(name=alias):
+        previous = list(client.indices.get_alias(name=alias))
+        actions += [{"remove": {"index": name, "alias": alias}} for name in previous if name != index]
+    elif client.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index, "alias": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    return [name for name in previous if name != index]
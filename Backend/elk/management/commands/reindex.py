@@ -0,0 +1,130 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from elasticsearch import helpers
+
+from elk.elasticsearch_client import es
+from elk.indices import (
+    MAPPINGS, MATCHES_INDEX, USERS_INDEX, match_document, swap_alias, user_document, versioned_name,
+)
+from tournaments.models import Match
+
+USER_FIELDS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'profile_image', 'intra_id', 'intra_login',
+    'is_oauth_user', 'is_two_factor_enabled', 'total_games', 'wins', 'losses', 'win_rate', 'rank', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the users and matches indices from the database into new versioned indices, "
+            "then atomically points the aliases at them. Rows updated while the command runs are indexed "
+            "again once the alias points at the new index; rows deleted meanwhile may be left in it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=[USERS_INDEX, MATCHES_INDEX], help="Rebuild one index only.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows read per query and documents per bulk request.")
+        parser.add_argument('--threads', type=int, default=4, help="Bulk requests in flight.")
+        parser.add_argument('--replicas', type=int, default=0, help="Replicas of the new index once loaded.")
+        parser.add_argument('--delete-old', action='store_true', help="Delete the indices the aliases pointed at before.")
+
+    def handle(self, *args, **options):
+        if not es.available:
+            raise CommandError("Elasticsearch is not reachable")
+        sources = {
+            USERS_INDEX: (
+                get_user_model().objects.only(*USER_FIELDS).order_by('id'),
+                user_document,
+            ),
+            MATCHES_INDEX: (
+                Match.objects.order_by('id'),
+                match_document,
+            ),
+        }
+        for alias, (queryset, to_document) in sources.items():
+            if options['only'] in (None, alias):
+                self.rebuild(alias, queryset, to_document, options)
+
+    def rebuild(self, alias, queryset, to_document, options):
+        chunk_size = options['chunk_size']
+        index = versioned_name(alias)
+        total = queryset.count()
+        self.stdout.write(f"Indexing {total} documents into {index}")
+        # No refresh and no replicas while loading, both are set once all documents are in
+        es.indices.create(index=index, body={
+            "settings": {"number_of_shards": 1, "number_of_replicas": 0, "refresh_interval": "-1"},
+            "mappings": MAPPINGS[alias],
+        })
+
+        def actions():
+            try:
+                for row in queryset.iterator(chunk_size=chunk_size):
+                    yield {'_index': index, '_id': row.pk, '_source': to_document(row)}
+            finally:
+                # parallel_bulk reads this generator from its own thread, which opened its own connection
+                connection.close()
+
+        # Changes the running server indexes during the load go to the old index, they are caught up after the swap
+        started_at = timezone.now()
+        try:
+            done, elapsed = self.load(index, actions(), total, options)
+            es.indices.put_settings(index=index, body={
+                "index": {"number_of_replicas": options['replicas'], "refresh_interval": None},
+            })
+            es.indices.refresh(index=index)
+            previous = swap_alias(es, alias, index)
+        except BaseException:
+            es.indices.delete(index=index, ignore=[404])
+            raise
+        self.stdout.write(self.style.SUCCESS(
+            f"{alias} -> {index}: {done} documents in {elapsed:.1f}s ({done / max(elapsed, 0.001):.0f} docs/s)"
+        ))
+        self.catch_up(alias, queryset.filter(updated_at__gte=started_at), to_document)
+        if previous and options['delete_old']:
+            es.indices.delete(index=','.join(previous), ignore=[404])
+            self.stdout.write(f"Deleted {', '.join(previous)}")
+        elif previous:
+            self.stdout.write(f"Previous index kept: {', '.join(previous)}")
+
+    def load(self, index, actions, total, options):
+        """
+        Bulk loads actions into index, reporting progress.
+        :return: (documents loaded, seconds taken)
+        """
+        started = last_report = time.monotonic()
+        done = failed = 0
+        for ok, item in helpers.parallel_bulk(
+            es, actions, thread_count=options['threads'], chunk_size=options['chunk_size'],
+            queue_size=options['threads'] * 2, raise_on_error=False, raise_on_exception=False,
+        ):
+            done += 1
+            if not ok:
+                failed += 1
+                if failed <= 10:
+                    self.stderr.write(f"  failed: {item}")
+            now = time.monotonic()
+            if now - last_report >= 2:
+                last_report = now
+                percent = done * 100 / total if total else 100
+                self.stdout.write(f"  {done}/{total} ({percent:.0f}%), {done / (now - started):.0f} docs/s")
+        if failed:
+            raise CommandError(f"{failed} of {done} documents failed, {index} deleted and the alias left unchanged")
+        return done, time.monotonic() - started
+
+    def catch_up(self, alias, queryset, to_document):
+        """
+        Indexes again, through the alias, the rows updated since the load started.
+        """
+        actions = (
+            {'_index': alias, '_id': row.pk, '_source': to_document(row)}
+            for row in queryset.iterator()
+        )
+        done, errors = helpers.bulk(es, actions, raise_on_error=False, raise_on_exception=False)
+        for item in errors[:10]:
+            self.stderr.write(f"  failed: {item}")
+        if errors:
+            raise CommandError(f"{alias}: {len(errors)} rows updated during the rebuild could not be indexed again")
+        if done:
+            self.stdout.write(f"{alias}: {done} rows updated during the rebuild indexed again")
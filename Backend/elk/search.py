@@ -0,0 +1,114 @@
+"""
+Player search.
+
+Usernames are matched by prefix (search_as_you_type) or, allowing typos,
+fuzzily in Elasticsearch. While Elasticsearch is unreachable the database
+answers instead: a prefix or pg_trgm similarity match on the uppercased
+username, both served by the user_username_trgm_idx GIN index.
+
+Results are cached for ELK_SEARCH_CACHE_TTL seconds per distinct query.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Q
+from django.db.models.functions import Upper
+from elasticsearch.exceptions import ElasticsearchException
+
+from core.cache import TTLCache
+from elk.elasticsearch_client import es
+from elk.indices import USERS_INDEX
+
+logger = logging.getLogger(__name__)
+
+# Elasticsearch's default index.max_result_window, it rejects searches with from + size beyond it
+MAX_RESULT_WINDOW = 10_000
+
+RESULT_FIELDS = ['username', 'profile_image', 'total_games', 'wins', 'losses', 'win_rate', 'rank']
+
+_cache = TTLCache(
+    maxsize=getattr(settings, 'ELK_SEARCH_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'ELK_SEARCH_CACHE_TTL', 10),
+)
+
+
+def search_users(q: str, rank: str = None, min_win_rate: float = None, max_win_rate: float = None,
+                 offset: int = 0, limit: int = 20) -> dict:
+    """
+    :param q: start of, or a misspelling of, a username
+    :param rank: only players of this rank
+    :param min_win_rate: only players with at least this win rate (percent)
+    :param max_win_rate: only players with at most this win rate (percent)
+    :return: {"count", "results", "source"}, best matches first, results
+             carrying the public fields of a player and their "id"
+    """
+    key = (q.lower(), rank, min_win_rate, max_win_rate, offset, limit)
+    result = _cache.get(key)
+    if result is not None:
+        return result
+    result = None
+    if es.available:
+        try:
+            result = _search_elasticsearch(q, rank, min_win_rate, max_win_rate, offset, limit)
+        except ElasticsearchException as e:
+            logger.warning("Elasticsearch user search failed, using the database: %s", e)
+    if result is None:
+        result = _search_database(q, rank, min_win_rate, max_win_rate, offset, limit)
+    _cache.set(key, result)
+    return result
+
+
+def _search_elasticsearch(q, rank, min_win_rate, max_win_rate, offset, limit):
+    filters = []
+    if rank:
+        # rank.keyword for a "users" index mapped dynamically, before ensure_index or reindex created it
+        filters.append({"bool": {"should": [{"term": {"rank": rank}}, {"term": {"rank.keyword": rank}}]}})
+    if min_win_rate is not None or max_win_rate is not None:
+        bounds = {"gte": min_win_rate, "lte": max_win_rate}
+        filters.append({"range": {"win_rate": {op: value for op, value in bounds.items() if value is not None}}})
+    body = {
+        "query": {
+            "bool": {
+                "should": [
+                    {"multi_match": {
+                        "query": q,
+                        "type": "bool_prefix",
+                        "fields": ["username", "username._2gram", "username._3gram"],
+                        "boost": 2,
+                    }},
+                    {"match": {"username": {"query": q, "fuzziness": "AUTO"}}},
+                ],
+                "minimum_should_match": 1,
+                "filter": filters,
+            }
+        },
+        "_source": RESULT_FIELDS,
+        "from": offset,
+        "size": limit,
+        "track_total_hits": True,
+    }
+    response = es.search(index=USERS_INDEX, body=body)
+    return {
+        'count': response['hits']['total']['value'],
+        'results': [{'id': int(hit['_id']), **hit['_source']} for hit in response['hits']['hits']],
+        'source': 'elasticsearch',
+    }
+
+
+def _search_database(q, rank, min_win_rate, max_win_rate, offset, limit):
+    name = q.upper()
+    users = get_user_model().objects.annotate(upper_username=Upper('username')).filter(
+        Q(upper_username__startswith=name) | Q(upper_username__trigram_similar=name)
+    )
+    if rank:
+        users = users.filter(rank=rank)
+    if min_win_rate is not None:
+        users = users.filter(win_rate__gte=min_win_rate)
+    if max_win_rate is not None:
+        users = users.filter(win_rate__lte=max_win_rate)
+    page = users.annotate(
+        similarity=TrigramSimilarity('upper_username', name)
+    ).order_by('-similarity', 'username').values('id', *RESULT_FIELDS)[offset:offset + limit]
+    return {'count': users.count(), 'results': list(page), 'source': 'database'}
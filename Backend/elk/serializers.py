@@ -0,0 +1,32 @@
+from rest_framework import serializers
+
+from users.stats import RANK_TIERS, TOP_RANK
+from .search import MAX_RESULT_WINDOW
+
+
+class UserSearchQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of GET /api/elk/search/
+    """
+    q = serializers.CharField(min_length=1, max_length=150)
+    rank = serializers.ChoiceField(choices=[rank for _, rank in RANK_TIERS] + [TOP_RANK], required=False)
+    min_win_rate = serializers.FloatField(min_value=0, max_value=100, required=False)
+    max_win_rate = serializers.FloatField(min_value=0, max_value=100, required=False)
+    offset = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+    def validate(self, attrs):
+        if attrs['offset'] + attrs['limit'] > MAX_RESULT_WINDOW:
+            raise serializers.ValidationError({'offset': f"offset + limit must not exceed {MAX_RESULT_WINDOW}"})
+        return attrs
+
+
+class UserSearchResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    profile_image = serializers.CharField(allow_null=True)
+    total_games = serializers.IntegerField()
+    wins = serializers.IntegerField()
+    losses = serializers.IntegerField()
+    win_rate = serializers.FloatField()
+    rank = serializers.CharField(allow_null=True)
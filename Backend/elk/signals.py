@@ -1,26 +1,31 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from elk.elasticsearch_client import es
+from elk.bulk import bulk_indexer, INDEXED_FIELDS, STATS_FIELDS
+from users.signals import stats_updated
 
 User = get_user_model()
 
+# Indexing happens in the background (see elk/bulk.py), the handlers only
+# queue the user once the change is committed
+
 @receiver(post_save, sender=User)
-def index_user_in_elasticsearch(sender, instance, **kwargs):
-    doc = {
-        "username": instance.username,
-        "email": instance.email,
-        "first_name": instance.first_name,
-        "last_name": instance.last_name,
-        "profile_image": instance.profile_image,
-        "intra_id": instance.intra_id,
-        "intra_login": instance.intra_login,
-        "is_oauth_user": instance.is_oauth_user,
-        "is_two_factor_enabled": instance.is_two_factor_enabled,
-        "total_games": instance.total_games,
-        "wins": instance.wins,
-        "losses": instance.losses,
-        "win_rate": instance.win_rate
-    }
-    es.index(index="users", id=instance.id, body=doc)
-    
\ No newline at end of file
+def index_user_in_elasticsearch(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(INDEXED_FIELDS).intersection(update_fields):
+        # e.g. last_login or token_version, nothing the document shows
+        return
+    user_id = instance.id
+    stats_only = update_fields is not None and set(INDEXED_FIELDS).intersection(update_fields) <= set(STATS_FIELDS)
+    transaction.on_commit(lambda: bulk_indexer.enqueue(user_id, stats_only=stats_only))
+
+@receiver(stats_updated, sender=User)
+def reindex_user_stats_in_elasticsearch(sender, user_id, **kwargs):
+    # Stats are updated with queryset.update(), which does not fire post_save.
+    # stats_updated is already sent after the commit.
+    bulk_indexer.enqueue(user_id, stats_only=True)
+
+@receiver(post_delete, sender=User)
+def delete_user_from_elasticsearch(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: bulk_indexer.enqueue(user_id))
@@ -1,5 +1,7 @@
 from django.urls import path
+from .views import IndexerStatsView, UserSearchView
 
 urlpatterns = [
-    # Add real endpoints here as needed
-]
\ No newline at end of file
+    path('indexer/', IndexerStatsView.as_view(), name='elk-indexer-stats'),
+    path('search/', UserSearchView.as_view(), name='elk-user-search'),
+]
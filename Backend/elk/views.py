@@ -1,3 +1,41 @@
-from django.http import JsonResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.authentication import JWTCookieAuthentication
+from .bulk import bulk_indexer
 from .elasticsearch_client import es
+from .search import search_users
+from .serializers import UserSearchQuerySerializer, UserSearchResultSerializer
+
+
+class IndexerStatsView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    """
+    GET /api/elk/indexer/
+    buffer size and counters of this process' bulk indexer, and the state of its Elasticsearch connection
+    """
+    def get(self, request):
+        return Response({**bulk_indexer.stats(), 'elasticsearch': es.status()}, status=status.HTTP_200_OK)
+
+
+class UserSearchView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
 
+    """
+    GET /api/elk/search/?q=<name>[&rank=][&min_win_rate=][&max_win_rate=][&offset=][&limit=]
+    players whose username starts like or resembles q, as {"count", "results", "source"}
+    """
+    def get(self, request):
+        query = UserSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        result = search_users(**query.validated_data)
+        return Response({
+            'count': result['count'],
+            'results': UserSearchResultSerializer(result['results'], many=True).data,
+            'source': result['source'],
+        }, status=status.HTTP_200_OK)
@@ -1,19 +1,10 @@
 #!/bin/sh
+set -e
 
-python manage.py makemigrations
-python manage.py migrate
-
-python manage.py collectstatic --noinput
-
-# Create superuser if DJANGO_SUPERUSER variables are set
-if [ -n "$DJANGO_SUPERUSER_USERNAME" ] && [ -n "$DJANGO_SUPERUSER_PASSWORD" ] && [ -n "$DJANGO_SUPERUSER_EMAIL" ]; then
-        echo "Creating superuser..."
-        python manage.py createsuperuser --noinput --username $DJANGO_SUPERUSER_USERNAME --email $DJANGO_SUPERUSER_EMAIL
-fi
-
-# Deploy blockchain contract
-echo "Deploying blockchain contract..."
-python /app/tournaments/deploy_chain.py
+# Migrations, static files, superuser and the blockchain contract.
+# Steps whose inputs did not change since the last start are skipped,
+# see tournaments/management/commands/bootstrap.py
+python manage.py bootstrap
 
 # Start server
 echo "Starting server..."
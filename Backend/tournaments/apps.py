@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class TournamentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tournaments'
 
+    def ready(self):
+        from core.background import start_periodic_job
+        from .indexer import index_blocks
+        from .storage import uses_chain
+        from .submitter import process_submissions
+        if not uses_chain():
+            return
+        start_periodic_job('tournament-submitter', getattr(settings, 'TOURNAMENT_SUBMITTER_INTERVAL', 0), process_submissions)
+        start_periodic_job('tournament-indexer', getattr(settings, 'TOURNAMENT_INDEXER_INTERVAL', 0), index_blocks)
@@ -1,6 +1,18 @@
 from web3 import Web3, HTTPProvider
+from web3.exceptions import ProviderConnectionError, TransactionNotFound, Web3RPCError, Web3TypeError
+from concurrent.futures import ThreadPoolExecutor
 from web3.middleware import ExtraDataToPOAMiddleware
+import functools
 import json
+import logging
+import os
+import threading
+import time
+import requests
+from django.conf import settings
+from core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 
 class Match:
@@ -35,117 +47,458 @@ class Tournament:
 # ------------------------
 # 1. Connect to local node
 # ------------------------
-# print("Connecting to local node...") 
+# One client and contract per worker process, created on first use and shared
+# by all threads. HTTP connections to the node are kept alive in a pool.
+
+BLOCKCHAIN_URL = os.environ.get('BLOCKCHAIN_URL', 'http://blockchain:8545')
+CONTRACT_PATH = '/app/tools/Tournaments.json'
+CONTRACT_ADDRESS_PATH = '/app/tools/contract_address.json'
+HTTP_POOL_SIZE = 10
+RPC_TIMEOUT = 10
+
+# Errors meaning the node went away, worth rebuilding the client for
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ProviderConnectionError)
+
+_client_lock = threading.Lock()
+_client = None
+_client_address_version = None  # mtime of contract_address.json when _client was built
 
-# -------------------------
-# 2. load the contract
-# -------------------------
 
 def init_account():
     """
     Initializes the account for the blockchain.
     :return: Web3 instance
     """
-    w3 = Web3(HTTPProvider('http://blockchain:8545'))
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    w3 = Web3(HTTPProvider(BLOCKCHAIN_URL, session=session, request_kwargs={'timeout': RPC_TIMEOUT}))
     w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-    print("Connected to local node:", w3.is_connected())
-    print("accounts: ", w3.eth.accounts)
     w3.eth.default_account = w3.eth.accounts[0]
-    print("Default account set to:", w3.eth.default_account)
-    print("balance:", w3.from_wei(w3.eth.get_balance(w3.eth.default_account), 'ether'), "ETH")
+    logger.info("Connected to %s, default account %s", BLOCKCHAIN_URL, w3.eth.default_account)
     return w3
 
-def load_contract():
+# -------------------------
+# 2. load the contract
+# -------------------------
+
+@functools.lru_cache(maxsize=None)
+def load_abi():
     """
-    Loads the contract from the blockchain.
-    :return: Contract object
+    Reads the contract ABI once per process.
+    :return: ABI list
     """
+    with open(CONTRACT_PATH, 'r') as file:
+        return json.load(file)['abi']
 
-    w3 = init_account()
-    with open('/app/tools/Tournaments.json', 'r') as file:
-        contract_data = json.load(file)
+def load_contract_address():
+    """
+    :return: deployed contract address or None if the contract was never deployed
+    """
+    try:
+        with open(CONTRACT_ADDRESS_PATH, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        logger.warning("No contract address found at %s", CONTRACT_ADDRESS_PATH)
+        return None
 
-    abi = contract_data['abi']
-    contract_address = None
+def _address_version():
     try:
-        with open('/app/tools/contract_address.json', 'r') as file:
-            contract_address = json.load(file)
-            print("Contract address loaded from file:", contract_address)
+        return os.stat(CONTRACT_ADDRESS_PATH).st_mtime_ns
     except FileNotFoundError:
-        print("No contract address found, deploying a new contract.")
-    return w3.eth.contract(address=contract_address, abi=abi)
-
-
-
-def save_tournament(tournament_name: str, matches: list):
-    """
-    Adds a tournament to the blockchain.
-    :param tournament_name: Name of the tournament
-    :param tournament_id: ID of the tournament
-    :param players: List of players
-    :param matches: List of matches
-    :return: Tournament ID
-    """
-    # Get the current tournament count
-    w3 = init_account()
-    contract = load_contract()
-    # count = contract.functions.getTournamentCount().call()
-    # print("Tournament count:", count)
-
-    # Create a new tournament
-    # print("name: ", tournament_name, count)
-    m = []
-    for match in matches:
-        a = Match(
-            Player1Name=match["Player1Name"],  # Make sure casing matches contract ABI
-            Player2Name=match["Player2Name"],
-            Player1Score=match["Player1Score"],
-            Player2Score=match["Player2Score"],
-            Winner=match["Winner"]
-            )
-        m.append(a)
-        # print("Match:", a)
-
-    # tournament = Tournament(tournament_name, count, m)
-
-    # Add the tournament to the blockchain
-    tx_hash = contract.functions.createTournament(
-        tournament_name,
-        matches
-    ).transact()
-    w3.eth.wait_for_transaction_receipt(tx_hash)
-    # print("Tournament added successfully.")
-
-    # Print the updated tournament count
-    t = contract.functions.getTournamentCount().call()
-    # print("Tournament count after adding:", t)
-    return t
-    
-
-def get_tournaments(name: str) -> list:
+        return None
+
+def get_client():
+    """
+    Returns the process-wide client, connecting on first use. Rebuilt when
+    contract_address.json changes, as deploy_chain.py --redeploy does.
+    :return: (Web3 instance, Contract object)
+    """
+    global _client, _client_address_version
+    version = _address_version()
+    client = _client
+    if client is None or version != _client_address_version:
+        with _client_lock:
+            if _client is None or version != _client_address_version:
+                w3 = init_account()
+                _client = (w3, w3.eth.contract(address=load_contract_address(), abi=load_abi()))
+                _client_address_version = version
+            client = _client
+    return client
+
+def reset_client():
+    """
+    Drops the shared client, the next call reconnects.
+    """
+    global _client
+    with _client_lock:
+        _client = None
+
+def with_client(operation, retry: bool = True):
+    """
+    Runs operation(w3, contract) with the shared client.
+    If the node connection failed, reconnects and retries once.
+    :param retry: False for writes, which may have reached the node before failing
+    """
+    try:
+        return operation(*get_client())
+    except CONNECTION_ERRORS:
+        logger.warning("Lost connection to %s, reconnecting", BLOCKCHAIN_URL)
+        reset_client()
+        if not retry:
+            raise
+        return operation(*get_client())
+
+
+def pending_nonce() -> int:
+    """
+    :return: next nonce of the default account, counting transactions still in the pool
+    """
+    return with_client(lambda w3, contract: w3.eth.get_transaction_count(w3.eth.default_account, 'pending'))
+
+
+def _transaction(w3, contract, submission: dict) -> dict:
+    if submission.get('merkle_root'):
+        # A root commitment (see tournaments.merkle): the root is the data of
+        # a transaction from the default account to itself
+        account = w3.eth.default_account
+        return {'from': account, 'to': account, 'data': submission['merkle_root'], 'nonce': hex(submission['nonce'])}
+    return {
+        'from': w3.eth.default_account,
+        'to': contract.address,
+        'data': contract.encode_abi('createTournament', args=[submission['name'], submission['matches']]),
+        'nonce': hex(submission['nonce']),
+    }
+
+
+def send_transactions(submissions: list) -> list:
+    """
+    Sends createTournament and root commitment transactions in one JSON-RPC
+    batch request, without waiting for them to be mined. web3 refuses
+    eth_sendTransaction inside batch_requests(), so the batch goes through
+    the provider; the node fills in gas and gas price as it does for transact().
+    :param submissions: dicts with the nonce and either the merkle_root or
+                        the tournament name and matches (keyed like the
+                        contract's Match struct)
+    :return: per submission, the transaction hash as hex string or the
+             Web3RPCError the node answered with
+    """
+    def send(w3, contract):
+        batch = [('eth_sendTransaction', [_transaction(w3, contract, submission)]) for submission in submissions]
+        responses = w3.provider.make_batch_request(batch)
+        if not isinstance(responses, list):
+            # The node rejected the batch as a whole
+            raise Web3RPCError(str(responses.get('error')), rpc_response=responses)
+        return [
+            Web3RPCError(str(response['error']), rpc_response=response) if response.get('error')
+            else response['result']
+            for response in responses
+        ]
+    return with_client(send, retry=False)
+
+
+# Roots read back from commitment transactions, which never change once mined
+_root_cache = TTLCache(
+    maxsize=getattr(settings, 'TOURNAMENT_ROOT_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'TOURNAMENT_ROOT_CACHE_TTL', 3600),
+)
+
+def committed_root(tx_hash: str):
+    """
+    :return: the root committed by a root commitment transaction (see
+             send_transactions), None if it is unknown
+    """
+    root = _root_cache.get(tx_hash)
+    if root is not None:
+        return root
+    def lookup(w3, contract):
+        try:
+            return Web3.to_hex(w3.eth.get_transaction(tx_hash)['input'])
+        except TransactionNotFound:
+            return None
+    root = with_client(lookup)
+    if root is not None:
+        _root_cache.set(tx_hash, root)
+    return root
+
+
+def tournament_receipts(tx_hashes: list) -> dict:
+    """
+    Looks up the outcome of many createTournament transactions at once.
+    Every block involved is read once, however many of the transactions it holds.
+    :param tx_hashes: transaction hashes as hex strings
+    :return: dict tx hash -> {"success", "block_number", "tournament_id"}
+             (tournament_id is None if the call reverted or did not go to
+             the contract), not yet mined transactions are left out
+    """
+    def lookup(w3, contract):
+        by_block = {}
+        for tx_hash in tx_hashes:
+            try:
+                receipt = w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            by_block.setdefault(receipt.blockNumber, {})[tx_hash] = receipt
+        result = {}
+        for block_number, ours in by_block.items():
+            # Ids are handed out in execution order: the count before this
+            # block plus the successful calls to the contract before ours
+            tournament_id = contract.functions.getTournamentCount().call(block_identifier=block_number - 1)
+            last_index = max(receipt.transactionIndex for receipt in ours.values())
+            for tx in w3.eth.get_block(block_number).transactions[:last_index + 1]:
+                tx_hash = Web3.to_hex(tx)
+                receipt = ours.get(tx_hash) or w3.eth.get_transaction_receipt(tx_hash)
+                success = receipt.status == 1
+                creates = success and receipt.to == contract.address
+                if tx_hash in ours:
+                    result[tx_hash] = {
+                        'success': success,
+                        'block_number': block_number,
+                        'tournament_id': tournament_id if creates else None
+                    }
+                if creates:
+                    tournament_id += 1
+        return result
+    return with_client(lookup)
+
+
+def is_transaction_known(tx_hash: str) -> bool:
+    """
+    :return: False if the node dropped the transaction from its pool
+    """
+    def lookup(w3, contract):
+        try:
+            w3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            return False
+        return True
+    return with_client(lookup)
+
+
+def find_sent_transaction(nonce: int, blocks: int):
+    """
+    Looks for the mined transaction of the default account with the given
+    nonce among the latest blocks, for a send whose hash was never recorded.
+    :param blocks: number of blocks to search back from the head
+    :return: transaction hash as hex string or None if it is not among them
+    """
+    def lookup(w3, contract):
+        account = w3.eth.default_account
+        latest = w3.eth.block_number
+        for number in range(latest, max(-1, latest - blocks), -1):
+            for tx in w3.eth.get_block(number, full_transactions=True).transactions:
+                if tx['from'] == account and tx['nonce'] == nonce:
+                    return Web3.to_hex(tx['hash'])
+        return None
+    return with_client(lookup)
+
+
+def tournament_to_dict(tournament) -> dict:
+    """
+    Converts a Tournament struct returned by the contract.
+    :param tournament: (name, Winner, id, matches) tuple
+    :return: dict in the shape served by the tournament endpoints
+    """
+    return {
+        "tournament_id": tournament[2],
+        "winner": tournament[1],
+        "matches": [
+            {
+                "matchType": "Tournament", 
+                "Player1Name": match[0],
+                "Player2Name": match[1],
+                "Player1Score": match[2],
+                "Player2Score": match[3],
+                "Winner": match[4]
+            } for match in tournament[3] ]
+    }
+
+
+# -------------------------
+# 3. cached reads
+# -------------------------
+# Decoded getTournaments results per name. An entry is fresh for
+# TOURNAMENT_CACHE_TTL seconds; after that it is still served while a
+# background refresh runs, for up to TOURNAMENT_CACHE_STALE_TTL seconds, so a
+# slow or unreachable node does not block profile loads.
+
+TOURNAMENT_CACHE_TTL = getattr(settings, 'TOURNAMENT_CACHE_TTL', 30)
+TOURNAMENT_CACHE_STALE_TTL = getattr(settings, 'TOURNAMENT_CACHE_STALE_TTL', 600)
+
+_tournament_cache = TTLCache(maxsize=getattr(settings, 'TOURNAMENT_CACHE_SIZE', 1000), ttl=TOURNAMENT_CACHE_STALE_TTL)
+_cache_lock = threading.Lock()
+_generations = {}
+_refreshing = set()
+_cache_counters = {'stale': 0, 'refresh_errors': 0}
+
+# Calls per JSON-RPC batch request, bounds the size of one node response
+BATCH_READ_SIZE = getattr(settings, 'TOURNAMENT_BATCH_READ_SIZE', 50)
+
+def _read_many(w3, contract, names: list) -> list:
+    """
+    Calls getTournaments for every name, in JSON-RPC batches of
+    BATCH_READ_SIZE calls. Providers without batch support get the calls
+    concurrently over the connection pool instead.
+    :return: raw results, in the order of names
+    """
+    calls = [contract.functions.getTournaments(name) for name in names]
+    results = []
+    try:
+        for start in range(0, len(calls), BATCH_READ_SIZE):
+            with w3.batch_requests() as batch:
+                for call in calls[start:start + BATCH_READ_SIZE]:
+                    batch.add(call)
+                results.extend(batch.execute())
+    except Web3TypeError:
+        with ThreadPoolExecutor(max_workers=min(HTTP_POOL_SIZE, len(calls))) as pool:
+            results = list(pool.map(lambda call: call.call(), calls))
+    return results
+
+def _fetch_tournaments(names: list) -> dict:
+    with _cache_lock:
+        generations = {name: _generations.get(name, 0) for name in names}
+    if len(names) == 1:
+        raw = [with_client(lambda w3, contract: contract.functions.getTournaments(names[0]).call())]
+    else:
+        raw = with_client(lambda w3, contract: _read_many(w3, contract, names))
+    result = {name: [tournament_to_dict(tournament) for tournament in tournaments] for name, tournaments in zip(names, raw)}
+    now = time.monotonic()
+    with _cache_lock:
+        for name, tournaments in result.items():
+            # Skip the store if the entry was invalidated while we were reading
+            if _generations.get(name, 0) == generations[name]:
+                _tournament_cache.set(name, (tournaments, now))
+    return result
+
+def _refresh(name: str):
+    try:
+        _fetch_tournaments([name])
+    except Exception:
+        logger.warning("Refreshing tournaments of %s failed, serving the cached copy", name, exc_info=True)
+        with _cache_lock:
+            _cache_counters['refresh_errors'] += 1
+    finally:
+        with _cache_lock:
+            _refreshing.discard(name)
+
+def _cached(name: str):
+    """
+    :return: the cached tournaments of name, refreshed in the background when
+             stale, or None if not cached
+    """
+    entry = _tournament_cache.get(name)
+    if entry is None:
+        return None
+    result, fetched_at = entry
+    if time.monotonic() - fetched_at > TOURNAMENT_CACHE_TTL:
+        with _cache_lock:
+            _cache_counters['stale'] += 1
+            start = name not in _refreshing
+            _refreshing.add(name)
+        if start:
+            threading.Thread(target=_refresh, args=(name,), name='tournament-cache-refresh', daemon=True).start()
+    return result
+
+def get_tournaments(name: str, fresh: bool = False) -> list:
     """
     Gets a tournament from the blockchain.
     :param name: Name of the tournament
+    :param fresh: bypass the cache and read the chain
     :return: a list of match arrays
     """
     # Get the tournaments ralated to the tournament name
-    result = []
-    contract = load_contract()
-    tournaments = contract.functions.getTournaments(name).call()
-    for tournament in tournaments:
-        result.append(
-        {
-            "tournament_id": tournament[2],
-            "winner": tournament[1],
-            "matches": [
-                {
-                    "matchType": "Tournament", 
-                    "Player1Name": match[0],
-                    "Player2Name": match[1],
-                    "Player1Score": match[2],
-                    "Player2Score": match[3],
-                    "Winner": match[4]
-                } for match in tournament[3] ]
-        }
-        )
+    result = None if fresh else _cached(name)
+    if result is None:
+        return _fetch_tournaments([name])[name]
     return result
+
+def get_tournaments_many(names: list, fresh: bool = False) -> dict:
+    """
+    Gets the tournaments of several names at once. Names not in the cache
+    are read together in JSON-RPC batch requests, one round-trip per batch.
+    :param names: Names of the tournaments
+    :param fresh: bypass the cache and read the chain
+    :return: dict name -> list of tournaments, see get_tournaments
+    """
+    names = list(dict.fromkeys(names))
+    result = {}
+    for name in names:
+        cached = None if fresh else _cached(name)
+        if cached is not None:
+            result[name] = cached
+    missing = [name for name in names if name not in result]
+    if missing:
+        result.update(_fetch_tournaments(missing))
+    return {name: result[name] for name in names}
+
+def invalidate_tournaments(*names: str):
+    """
+    Drops the cached tournaments of the given names, called when one of
+    their tournaments is confirmed on chain.
+    """
+    with _cache_lock:
+        for name in names:
+            _generations[name] = _generations.get(name, 0) + 1
+            _tournament_cache.delete(name)
+
+def tournament_cache_stats() -> dict:
+    """
+    :return: size, hits and misses of the tournament cache, plus how often a
+             stale entry was served and how many background refreshes failed
+    """
+    with _cache_lock:
+        return {**_tournament_cache.stats(), **_cache_counters}
+
+
+def get_tournament(tournament_id: int) -> dict:
+    """
+    Gets a single tournament from the blockchain.
+    :param tournament_id: id of the tournament in the contract
+    :return: tournament dict, see tournament_to_dict
+    """
+    return tournament_to_dict(with_client(lambda w3, contract: contract.functions.getTournament(tournament_id).call()))
+
+
+def latest_block() -> int:
+    """
+    :return: number of the newest block
+    """
+    return with_client(lambda w3, contract: w3.eth.block_number)
+
+
+def tournaments_in_blocks(first: int, last: int, next_id: int) -> list:
+    """
+    Collects the tournaments created in a range of blocks.
+    The contract emits no events, and a node without archive state cannot
+    answer calls at old blocks, so every block is scanned for successful
+    createTournament transactions and the tournament is decoded from the
+    transaction input. The contract hands out ids in execution order.
+    :param first: first block number
+    :param last: last block number, inclusive
+    :param next_id: id of the first tournament created from block first on
+    :return: list of tournament dicts with "name", "block_number" and "tx_hash" added
+    """
+    def scan(w3, contract):
+        found = []
+        tournament_id = next_id
+        for number in range(max(first, 1), last + 1):
+            for tx in w3.eth.get_block(number, full_transactions=True).transactions:
+                if tx['to'] != contract.address:
+                    continue
+                function, arguments = contract.decode_function_input(tx['input'])
+                if function.fn_name != 'createTournament' or w3.eth.get_transaction_receipt(tx['hash']).status != 1:
+                    continue
+                matches = arguments['_matches']
+                found.append({
+                    'tournament_id': tournament_id,
+                    # Like the contract, the winner of the last match wins the tournament
+                    'winner': matches[-1]['Winner'] if matches else '',
+                    'matches': [{'matchType': 'Tournament', **match} for match in matches],
+                    'name': arguments['_name'],
+                    'block_number': number,
+                    'tx_hash': Web3.to_hex(tx['hash']),
+                })
+                tournament_id += 1
+        return found
+    return with_client(scan)
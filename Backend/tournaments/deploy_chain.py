@@ -1,54 +1,192 @@
+"""
+Deploys the Tournaments contract and keeps contract_address.json pointing at it.
+
+Safe to import: nothing connects to the chain until a function is called.
+Run as a script, or through `python manage.py bootstrap`, it deploys the
+contract only when no verified deployment exists.
+
+`python manage.py bootstrap --redeploy` deploys the contract in
+/app/tools/Tournaments.json even if one is already deployed, copies the old
+contract's tournaments over (keeping their ids) and points
+contract_address.json at the new contract. Running servers switch to it on
+their next chain call (see block.get_client). The copies are sent from the
+submitter's account, so bootstrap pauses the submitter and refuses while
+any of its transactions are in flight; the script itself does not redeploy.
+Run `python manage.py index_tournaments --reset` afterwards.
+"""
 from web3 import Web3, HTTPProvider
 from web3.middleware import ExtraDataToPOAMiddleware
 import os
+import sys
 import json
+import time
+
+BLOCKCHAIN_URL = os.environ.get('BLOCKCHAIN_URL', 'http://blockchain:8545')
+CONTRACT_PATH = '/app/tools/Tournaments.json'
+CONTRACT_ADDRESS_PATH = '/app/tools/contract_address.json'
+PREVIOUS_ADDRESS_PATH = '/app/tools/contract_address.previous.json'
+
+# verify_deployment results
+DEPLOYED = 'deployed'
+MISSING = 'missing'
+MISMATCH = 'mismatch'
 
 
 # ------------------------
 # 1. Connect to local node
 # ------------------------
-print("Connecting to local node...") 
-w3 = Web3(HTTPProvider('http://blockchain:8545'))
-w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-print("Connected to local node:", w3.is_connected())
-print("accounts: ", w3.eth.accounts)
-w3.eth.default_account = w3.eth.accounts[0]
-print("Default account set to:", w3.eth.default_account)
-print("balance:", w3.from_wei(w3.eth.get_balance(w3.eth.default_account), 'ether'), "ETH")
+
+def connect(timeout: float = 60):
+    """
+    Connects to the node, waiting for it to come up.
+    :param timeout: seconds to wait before giving up
+    :return: Web3 instance with the default account set
+    """
+    w3 = Web3(HTTPProvider(BLOCKCHAIN_URL))
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    deadline = time.monotonic() + timeout
+    while not w3.is_connected():
+        if time.monotonic() > deadline:
+            raise ConnectionError(f"Blockchain node at {BLOCKCHAIN_URL} is not reachable")
+        time.sleep(1)
+    w3.eth.default_account = w3.eth.accounts[0]
+    return w3
 
 
 # -------------------------
 # 2. load the contract
 # -------------------------
 
-with open('/app/tools/Tournaments.json', 'r') as file:
-    contract_data = json.load(file)
+def load_artifact():
+    """
+    :return: (abi, creation bytecode) from Tournaments.json
+    """
+    with open(CONTRACT_PATH, 'r') as file:
+        contract_data = json.load(file)
+    return contract_data['abi'], contract_data['bytecode']
 
-abi = contract_data['abi']
-bytecode = contract_data['bytecode']
+def load_address():
+    """
+    :return: address from contract_address.json or None
+    """
+    if not os.path.exists(CONTRACT_ADDRESS_PATH):
+        return None
+    with open(CONTRACT_ADDRESS_PATH, 'r') as file:
+        return json.load(file)
+
+def save_address(address: str, path: str = None):
+    with open(path or CONTRACT_ADDRESS_PATH, 'w') as file:
+        json.dump(address, file)
+
+def verify_deployment(w3, address, bytecode: str, known_code_hash: str = None):
+    """
+    Compares the code deployed at address with the artifact.
+    With known_code_hash, the hash of the code a previous run deployed or
+    verified at this address for this artifact, the deployed code must hash
+    to it. Without, the runtime code must be found inside the creation
+    bytecode, which holds the runtime code of a contract.
+    Connection errors are raised, never taken for a missing contract.
+    :return: (DEPLOYED | MISSING | MISMATCH, keccak hash of the deployed code or None)
+    """
+    if not address:
+        return MISSING, None
+    code = w3.eth.get_code(address)
+    if not code:
+        return MISSING, None
+    code_hash = Web3.to_hex(Web3.keccak(code))
+    if known_code_hash is not None:
+        return (DEPLOYED if code_hash == known_code_hash else MISMATCH), code_hash
+    if Web3.to_hex(code)[2:].lower() not in bytecode.lower().removeprefix('0x'):
+        return MISMATCH, code_hash
+    return DEPLOYED, code_hash
 
-try:
-    if os.path.exists('/app/tools/contract_address.json'):
-        with open('/app/tools/contract_address.json', 'r') as file:
-            contract_address = json.load(file)
-        if w3.eth.contract(address=contract_address, abi=abi).functions.getTournamentCount().call() >= 0:
-            print("Contract already deployed at:", contract_address)
-            exit(0)
-except Exception as e:
-    pass
 
 # ------------------------
 # 3. Deploy the contract
 # ------------------------
-print("Deploying contract...")
-Contract = w3.eth.contract(abi=abi, bytecode=bytecode)
-tx_hash = Contract.constructor().transact({'gas': 5000000})
-print("Transaction hash:", tx_hash.hex())
-tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-contract = w3.eth.contract(address=tx_receipt.contractAddress, abi=abi)
-
-print("✅ Contract deployed at:", contract.address)
-
-with open('/app/tools/contract_address.json', 'w') as file:
-    json.dump(contract.address, file)
-print("Contract address saved to contract_address.json")
+
+def deploy(w3, abi, bytecode):
+    """
+    :return: the deployed Contract object
+    """
+    Contract = w3.eth.contract(abi=abi, bytecode=bytecode)
+    tx_hash = Contract.constructor().transact({'gas': 5000000})
+    print("Transaction hash:", tx_hash.hex())
+    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.eth.contract(address=tx_receipt.contractAddress, abi=abi)
+
+
+# ------------------------
+# 4. Migrate tournaments
+# ------------------------
+
+def migrate_tournaments(w3, previous_contract, contract) -> bool:
+    """
+    Copies every tournament of previous_contract into contract, in id order.
+    :return: True if all tournaments arrived
+    """
+    total = previous_contract.functions.getTournamentCount().call()
+    print(f"Copying {total} tournaments from {previous_contract.address}...")
+    last_tx = None
+    for tournament_id in range(total):
+        name, _, _, matches = previous_contract.functions.getTournament(tournament_id).call()
+        last_tx = contract.functions.createTournament(name, matches).transact()
+    if last_tx is not None:
+        w3.eth.wait_for_transaction_receipt(last_tx)
+    copied = contract.functions.getTournamentCount().call()
+    if copied != total:
+        print(f"Copied {copied} of {total} tournaments")
+        return False
+    return True
+
+
+def ensure_deployed(w3=None, redeploy: bool = False, known: dict = None) -> dict:
+    """
+    Makes sure contract_address.json points at a deployment of Tournaments.json.
+    Deploys only when there is no contract at the saved address. Code that
+    does not match the artifact is reported and left alone unless redeploy
+    is set, then the tournaments are migrated to a fresh deployment.
+    :param known: "address" and "code_hash" returned by an earlier call for
+                  the same artifact, the deployed code is checked against it
+    :return: dict with "action" (verified, deployed, redeployed, mismatch or
+             failed), "address" and "code_hash"
+    """
+    w3 = w3 or connect()
+    abi, bytecode = load_artifact()
+    address = load_address()
+    known_code_hash = known['code_hash'] if known and known.get('address') == address else None
+    state, code_hash = verify_deployment(w3, address, bytecode, known_code_hash)
+    if state == DEPLOYED and not redeploy:
+        return {'action': 'verified', 'address': address, 'code_hash': code_hash}
+    if state == MISMATCH and not redeploy:
+        print(f"Code at {address} does not match Tournaments.json, run `python manage.py bootstrap --redeploy` to migrate")
+        return {'action': 'mismatch', 'address': address, 'code_hash': code_hash}
+
+    print("Deploying contract...")
+    contract = deploy(w3, abi, bytecode)
+    print("✅ Contract deployed at:", contract.address)
+    action = 'deployed'
+    if state != MISSING:
+        previous_contract = w3.eth.contract(address=address, abi=abi)
+        if not migrate_tournaments(w3, previous_contract, contract):
+            print("Keeping the old contract address")
+            return {'action': 'failed', 'address': address, 'code_hash': code_hash}
+        save_address(previous_contract.address, PREVIOUS_ADDRESS_PATH)
+        print("Tournaments copied, previous address saved to contract_address.previous.json")
+        action = 'redeployed'
+    save_address(contract.address)
+    print("Contract address saved to contract_address.json")
+    return {
+        'action': action,
+        'address': contract.address,
+        'code_hash': Web3.to_hex(Web3.keccak(w3.eth.get_code(contract.address))),
+    }
+
+
+if __name__ == '__main__':
+    if '--redeploy' in sys.argv:
+        print("Redeploy with `python manage.py bootstrap --redeploy`, which keeps the submitter from sending meanwhile")
+        sys.exit(2)
+    result = ensure_deployed()
+    print(f"Contract {result['action']} at {result['address']} (code hash {result['code_hash']})")
+    sys.exit(1 if result['action'] == 'failed' else 0)
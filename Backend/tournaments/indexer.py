@@ -0,0 +1,163 @@
+"""
+Mirrors the tournaments stored in the contract into the Tournament table so
+reads are served by the database instead of the chain node.
+
+The indexer tails the chain from its checkpoint, block range by block range,
+and upserts every tournament created in the range, decoded from the
+transactions themselves so the node needs no historical state. The
+checkpoint moves in the same transaction as the rows, so a crash never skips
+a block. Runs hold a database advisory lock: however many server processes
+and index_tournaments commands there are, one indexes at a time.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from core.background import exclusive
+from . import block
+from .models import IndexerCheckpoint, Tournament
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'tournaments'
+CHUNK_SIZE = getattr(settings, 'TOURNAMENT_INDEXER_CHUNK_SIZE', 500)
+# Blocks to stay behind the head, for chains that can reorganise
+CONFIRMATIONS = getattr(settings, 'TOURNAMENT_INDEXER_CONFIRMATIONS', 0)
+
+UPDATE_FIELDS = ['name', 'winner', 'matches', 'block_number', 'tx_hash']
+
+
+def checkpoint() -> int:
+    """
+    :return: last indexed block, -1 before the first run
+    """
+    row = IndexerCheckpoint.objects.filter(name=CHECKPOINT).first()
+    return row.block_number if row else -1
+
+
+def store_tournaments(tournaments: list):
+    """
+    Upserts tournament dicts as returned by block.tournaments_in_blocks.
+    """
+    Tournament.objects.bulk_create(
+        [Tournament(tournament_id=item['tournament_id'], **{field: item[field] for field in UPDATE_FIELDS})
+         for item in tournaments],
+        update_conflicts=True,
+        unique_fields=['tournament_id'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def next_tournament_id() -> int:
+    """
+    :return: id the contract gave the first tournament after the checkpoint,
+             ids start at 0 and every earlier one is mirrored
+    """
+    last = Tournament.objects.filter(tournament_id__isnull=False).aggregate(last=Max('tournament_id'))['last']
+    return 0 if last is None else last + 1
+
+
+def index_blocks(max_blocks: int = None) -> int:
+    """
+    Indexes the blocks between the checkpoint and the chain head, unless
+    another process is indexing.
+    :param max_blocks: stop after this many blocks (None = until the head)
+    :return: number of tournaments stored
+    """
+    with exclusive('tournament-indexer') as acquired:
+        if not acquired:
+            return 0
+        return _index_blocks(max_blocks)
+
+
+def _index_blocks(max_blocks):
+    head = block.latest_block() - CONFIRMATIONS
+    first = checkpoint() + 1
+    if max_blocks is not None:
+        head = min(head, first + max_blocks - 1)
+    stored = 0
+    while first <= head:
+        last = min(head, first + CHUNK_SIZE - 1)
+        tournaments = block.tournaments_in_blocks(first, last, next_tournament_id())
+        with transaction.atomic():
+            store_tournaments(tournaments)
+            IndexerCheckpoint.objects.update_or_create(name=CHECKPOINT, defaults={'block_number': last})
+        block.invalidate_tournaments(*{item['name'] for item in tournaments})
+        if tournaments:
+            logger.info("Indexed %d tournaments from blocks %d-%d", len(tournaments), first, last)
+        stored += len(tournaments)
+        first = last + 1
+    return stored
+
+
+def reset_index():
+    """
+    Forgets the checkpoint and the mirrored rows, e.g. after the contract was redeployed.
+    """
+    with transaction.atomic():
+        Tournament.objects.filter(tournament_id__isnull=False).delete()
+        IndexerCheckpoint.objects.filter(name=CHECKPOINT).delete()
+
+
+def for_name(name: str):
+    """
+    :return: tournaments of a name in chain order, Merkle-committed ones included
+    """
+    return for_names([name])
+
+
+def for_names(names: list):
+    return Tournament.objects.filter(name__in=names).order_by('block_number', 'tournament_id', 'id')
+
+
+def user_tournaments(name: str, verify: bool = False) -> list:
+    """
+    Tournaments recorded under a name, read from the database.
+    Falls back to the (cached) chain while the indexer has never run.
+    :param verify: also read the chain and serve it if the mirror disagrees
+    :return: list of tournament dicts, in the shape of block.get_tournaments
+    """
+    return users_tournaments([name], verify=verify)[name]
+
+
+def users_tournaments(names: list, verify: bool = False) -> dict:
+    """
+    Tournaments of several names with one query, or one batched chain read
+    while the indexer has never run.
+    :param verify: also read the chain and serve it where the mirror disagrees
+    :return: dict name -> list of tournament dicts
+    """
+    if checkpoint() < 0:
+        return block.get_tournaments_many(names)
+    result = {name: [] for name in names}
+    for row in for_names(names):
+        result[row.name].append(row.as_dict())
+    if verify:
+        on_chain = block.get_tournaments_many(names, fresh=True)
+        for name, rows in result.items():
+            if on_chain[name] != [row for row in rows if row['tournament_id'] is not None]:
+                logger.warning("Tournament index of %s is out of sync with the chain", name)
+                result[name] = on_chain[name] + [row for row in rows if row['tournament_id'] is None]
+    return result
+
+
+def user_tournament_page(name: str, offset: int, limit: int, verify: bool = False):
+    """
+    One page of the tournaments recorded under a name, read from the database.
+    :param verify: also read the page from the chain and serve it if the mirror disagrees
+    :return: (total count, list of tournament dicts)
+    """
+    queryset = for_name(name)
+    rows = [row.as_dict() for row in queryset[offset:offset + limit]]
+    if verify:
+        # Merkle-committed tournaments only live here, their proofs verify them
+        for i, row in enumerate(rows):
+            if row['tournament_id'] is None:
+                continue
+            on_chain = block.get_tournament(row['tournament_id'])
+            if on_chain != row:
+                logger.warning("Tournament %s is out of sync with the chain", row['tournament_id'])
+                rows[i] = on_chain
+    return queryset.count(), rows
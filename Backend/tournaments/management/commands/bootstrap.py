@@ -0,0 +1,174 @@
+import hashlib
+import importlib.util
+import json
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+
+from core.background import exclusive
+from tournaments import deploy_chain, submitter
+from tournaments.storage import uses_chain
+
+
+def _hash_files(paths):
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(path.encode())
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def models_hash():
+    """
+    :return: hash of every app's models module and migration files,
+             what makemigrations looks at
+    """
+    paths = set()
+    for app_config in apps.get_app_configs():
+        if app_config.models_module is not None and getattr(app_config.models_module, '__file__', None):
+            paths.add(app_config.models_module.__file__)
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        spec = importlib.util.find_spec(module_name) if module_name else None
+        for migrations_dir in (spec.submodule_search_locations or []) if spec else []:
+            paths.update(os.path.join(migrations_dir, name) for name in os.listdir(migrations_dir) if name.endswith('.py'))
+    return _hash_files(paths)
+
+
+def static_hash():
+    """
+    :return: hash of the paths, sizes and modification times of all static files
+    """
+    digest = hashlib.sha256()
+    for finder in get_finders():
+        for path, storage in finder.list([]):
+            stat = os.stat(storage.path(path))
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ("Prepares the backend for serving: migrations, static files, superuser and the "
+            "Tournaments contract (only with a chain storage backend). Steps whose inputs did not change since the last run are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Run every step, ignoring the saved hashes.")
+        parser.add_argument('--skip-contract', action='store_true', help="Do not touch the blockchain.")
+        parser.add_argument('--redeploy', action='store_true', help="Redeploy the contract and migrate its tournaments, once no submission is in flight.")
+
+    def handle(self, *args, **options):
+        self.force = options['force']
+        self.state_path = getattr(settings, 'BOOTSTRAP_STATE_PATH', os.path.join(settings.BASE_DIR, 'data', 'bootstrap_state.json'))
+        self.state = self.load_state()
+        self.timings = []
+        started = time.monotonic()
+
+        self.phase('makemigrations', self.make_migrations)
+        migrated = self.phase('migrate', self.migrate)
+        if migrated:
+            # Link player names of matches recorded before the player foreign keys existed
+            self.phase('link_match_players', lambda: call_command('link_match_players') or 'ran')
+        self.phase('collectstatic', self.collect_static)
+        self.phase('superuser', self.create_superuser)
+        self.phase('contract', lambda: self.ensure_contract(options['skip_contract'], options['redeploy']))
+
+        self.save_state()
+        self.stdout.write("Startup timings:")
+        for name, outcome, seconds in self.timings:
+            self.stdout.write(f"  {name:<20} {outcome:<40} {seconds * 1000:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Bootstrap finished in {time.monotonic() - started:.2f}s"))
+
+    def phase(self, name, func):
+        started = time.monotonic()
+        outcome = func()
+        self.timings.append((name, outcome, time.monotonic() - started))
+        return outcome not in ('skipped', 'up to date')
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path, 'w') as file:
+            json.dump(self.state, file, indent=2)
+
+    def unchanged(self, key, value):
+        return not self.force and self.state.get(key) == value
+
+    def make_migrations(self):
+        if self.unchanged('models', models_hash()):
+            return 'skipped'
+        call_command('makemigrations', interactive=False)
+        self.state['models'] = models_hash()
+        return 'ran'
+
+    def migrate(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan and not self.force:
+            return 'up to date'
+        call_command('migrate', interactive=False)
+        return f'applied {len(plan)} migrations'
+
+    def collect_static(self):
+        current = static_hash()
+        if self.unchanged('static', current) and os.path.isdir(settings.STATIC_ROOT):
+            return 'skipped'
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.state['static'] = current
+        return 'ran'
+
+    def create_superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+        if not (username and os.environ.get('DJANGO_SUPERUSER_PASSWORD') and os.environ.get('DJANGO_SUPERUSER_EMAIL')):
+            return 'skipped'
+        if get_user_model().objects.filter(username=username).exists():
+            return 'skipped'
+        call_command('createsuperuser', interactive=False, username=username, email=os.environ['DJANGO_SUPERUSER_EMAIL'])
+        return 'ran'
+
+    def ensure_contract(self, skip, redeploy):
+        # Database and memory storage run without a chain, which may not even be up
+        if skip or not uses_chain():
+            return 'skipped'
+        artifact = _hash_files([deploy_chain.CONTRACT_PATH])
+        known = self.state.get('contract')
+        if self.force or not known or known.get('artifact') != artifact:
+            known = None
+        try:
+            if redeploy:
+                result = self.redeploy_contract(known)
+            else:
+                result = deploy_chain.ensure_deployed(known=known)
+        except (ConnectionError, OSError) as e:
+            raise CommandError(f"Could not verify the Tournaments contract: {e}")
+        if result['action'] in ('verified', 'deployed', 'redeployed'):
+            self.state['contract'] = {'address': result['address'], 'code_hash': result['code_hash'], 'artifact': artifact}
+        if result['action'] == 'failed':
+            raise CommandError("Contract migration failed, see above")
+        return f"{result['action']} {result['address']}"
+
+    def redeploy_contract(self, known):
+        # The migration sends from the submitter's account with nonces assigned by the node,
+        # so no submitter cycle may run meanwhile and none of its transactions may be in flight
+        with exclusive(submitter.LOCK_NAME) as acquired:
+            if not acquired:
+                raise CommandError("A tournament submitter cycle is running, try the redeploy again")
+            pending = submitter.in_flight()
+            if pending:
+                raise CommandError(f"{pending} tournament submissions are not confirmed yet, redeploy once they are")
+            return deploy_chain.ensure_deployed(redeploy=True, known=known)
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tournaments.indexer import checkpoint, index_blocks, reset_index
+
+
+class Command(BaseCommand):
+    help = ("Mirrors the tournaments stored in the contract into the database, "
+            "starting from the last indexed block.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Drop the mirrored tournaments and index from block 0.")
+        parser.add_argument('--max-blocks', type=int, default=None, help="Stop after this many blocks.")
+        parser.add_argument('--follow', type=float, default=None, metavar='SECONDS',
+                            help="Keep tailing the chain, polling every SECONDS.")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_index()
+            self.stdout.write("Index reset")
+        while True:
+            stored = index_blocks(max_blocks=options['max_blocks'])
+            self.stdout.write(f"Indexed {stored} tournaments, checkpoint at block {checkpoint()}")
+            if options['follow'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['follow'])
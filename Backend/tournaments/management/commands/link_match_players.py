@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from tournaments.models import Match
+from tournaments.players import PLAYER_FIELDS, backfill_players
+
+
+class Command(BaseCommand):
+    help = "Links the player name columns of existing matches to user rows, in id-range batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Match ids covered per UPDATE.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Match.objects.aggregate(last=Max('id'))['last'] or 0
+        started = time.monotonic()
+        linked = 0
+        for start in range(0, last_id + 1, batch_size):
+            batch = Match.objects.filter(id__gte=start, id__lt=start + batch_size)
+            for name_field, fk_field in PLAYER_FIELDS:
+                linked += backfill_players(batch, fk_field, name_field)
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {linked} player references in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tournaments.submitter import process_submissions
+
+
+class Command(BaseCommand):
+    help = ("Sends queued tournament submissions to the blockchain and tracks their receipts. "
+            "Cycles take the same advisory lock as the server's in-process job, one of them sends at a time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between cycles.")
+        parser.add_argument('--once', action='store_true', help="Run a single cycle and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, confirmed = process_submissions()
+            if sent or confirmed:
+                self.stdout.write(f"sent {sent}, confirmed {confirmed}")
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
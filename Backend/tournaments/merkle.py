@@ -0,0 +1,114 @@
+"""
+Merkle commitments for tournaments kept off chain.
+
+In the "merkle" storage mode a tournament's matches stay in the database and
+only the 32-byte Merkle root is written to the chain, as the data of a plain
+transaction from the server account to itself. The cost of a commitment is
+the same however many matches the tournament has.
+
+Anyone holding a match, its proof and the commitment's transaction hash can
+check the match: hash the leaf, fold the proof into a root and compare it with
+the transaction's input data.
+
+    leaf = keccak256(0x00 || abi.encode(Player1Name, Player2Name,
+                                        Player1Score, Player2Score, Winner))
+    node = keccak256(0x01 || left || right)
+
+A node without a sibling is carried up to the next level unchanged.
+"""
+from eth_abi import encode
+from web3 import Web3
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+MATCH_FIELDS = ['Player1Name', 'Player2Name', 'Player1Score', 'Player2Score', 'Winner']
+MATCH_TYPES = ['string', 'string', 'uint256', 'uint256', 'string']
+
+
+class InvalidMatch(ValueError):
+    """
+    A match that cannot be encoded as the contract's Match struct.
+    """
+
+
+def match_values(match) -> list:
+    """
+    :param match: match keyed like the contract's Match struct
+    :return: the values of the struct, in ABI order
+    :raises InvalidMatch: if a field is missing, a name is not a string or
+                          a score is not a non-negative integer
+    """
+    if not isinstance(match, dict):
+        raise InvalidMatch("A match must be an object")
+    values = []
+    for field, abi_type in zip(MATCH_FIELDS, MATCH_TYPES):
+        value = match.get(field)
+        if abi_type == 'string' and not isinstance(value, str):
+            raise InvalidMatch(f"{field} must be a string")
+        if abi_type == 'uint256':
+            if isinstance(value, str) and value.isdigit():
+                value = int(value)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise InvalidMatch(f"{field} must be a non-negative integer")
+        values.append(value)
+    return values
+
+
+def leaf_hash(match: dict) -> bytes:
+    """
+    :param match: match keyed like the contract's Match struct
+    :return: 32-byte leaf hash
+    :raises InvalidMatch: see match_values
+    """
+    return Web3.keccak(LEAF_PREFIX + encode(MATCH_TYPES, match_values(match)))
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return Web3.keccak(NODE_PREFIX + left + right)
+
+
+def _levels(leaves: list) -> list:
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(matches: list) -> str:
+    """
+    :param matches: matches keyed like the contract's Match struct
+    :return: root as 0x-prefixed hex, the hash of an empty leaf list for no matches
+    """
+    if not matches:
+        return Web3.to_hex(Web3.keccak(NODE_PREFIX))
+    return Web3.to_hex(_levels([leaf_hash(match) for match in matches])[-1][0])
+
+
+def merkle_proof(matches: list, index: int) -> list:
+    """
+    :param matches: all matches of the tournament
+    :param index: position of the match to prove
+    :return: list of {"position": "left"|"right", "hash"} siblings, leaf to root
+    """
+    proof = []
+    for level in _levels([leaf_hash(match) for match in matches])[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({'position': 'left' if sibling < index else 'right', 'hash': Web3.to_hex(level[sibling])})
+        index //= 2
+    return proof
+
+
+def verify_proof(match: dict, proof: list, root: str) -> bool:
+    """
+    Folds a proof from merkle_proof into a root and compares it with root.
+    """
+    current = leaf_hash(match)
+    for step in proof:
+        sibling = Web3.to_bytes(hexstr=step['hash'])
+        current = node_hash(sibling, current) if step['position'] == 'left' else node_hash(current, sibling)
+    return Web3.to_hex(current) == root
@@ -1,13 +1,104 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.conf import settings
 
 class Tournament(models.Model):
+    """
+    Off-chain copy of a tournament stored in the contract, kept up to date
+    by tournaments.indexer. The contract stays the source of truth.
+    """
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     matches = models.JSONField(default=list, blank=True, null=True)
+    # Id of the tournament in the contract
+    tournament_id = models.PositiveIntegerField(unique=True, null=True, blank=True)
+    name = models.CharField(max_length=150, blank=True, default='')
+    winner = models.CharField(max_length=150, blank=True, default='')
+    block_number = models.PositiveBigIntegerField(null=True, blank=True)
+    tx_hash = models.CharField(max_length=66, null=True, blank=True)
+    # Set for tournaments stored here and only committed on chain (see tournaments.merkle)
+    merkle_root = models.CharField(max_length=66, null=True, blank=True)
 
     def __str__(self):
         return f"Tournament {self.id}"
 
+    def as_dict(self):
+        """
+        :return: the tournament in the shape of block.get_tournaments
+        """
+        if self.merkle_root:
+            return {'id': self.id, 'tournament_id': None, 'winner': self.winner, 'matches': self.matches,
+                    'merkle_root': self.merkle_root, 'tx_hash': self.tx_hash}
+        if self.tournament_id is None:
+            # Stored by DatabaseStorage, never on chain
+            return {'id': self.id, 'tournament_id': None, 'winner': self.winner, 'matches': self.matches}
+        return {'tournament_id': self.tournament_id, 'winner': self.winner, 'matches': self.matches}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'tournament_id'], name='tournament_name_idx'),
+        ]
+
+
+class IndexerCheckpoint(models.Model):
+    """
+    Last block an indexer has fully processed.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    block_number = models.BigIntegerField(default=-1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at block {self.block_number}"
+
+
+class MatchQuerySet(models.QuerySet):
+    """
+    Per-player queries go through the indexed player foreign keys,
+    never through the free-text name columns.
+    """
+    def for_player(self, user):
+        return self.filter(Q(player1_user=user) | Q(player2_user=user))
+
+    def won_by(self, user):
+        return self.filter(winner_user=user)
+
+    def head_to_head(self, user, opponent):
+        return self.filter(
+            Q(player1_user=user, player2_user=opponent) | Q(player1_user=opponent, player2_user=user)
+        )
+
+    def against(self, user, opponent: str):
+        """
+        Matches of user against the player named opponent: by foreign key for
+        a registered player, by name for AI and guest players.
+        """
+        from django.contrib.auth import get_user_model
+        opponent_user = get_user_model().objects.filter(username=opponent).first()
+        if opponent_user is not None:
+            return self.head_to_head(user, opponent_user)
+        return self.filter(
+            Q(player1_user=user, player2_user__isnull=True, player2Name=opponent)
+            | Q(player2_user=user, player1_user__isnull=True, player1Name=opponent)
+        )
+
+    def player_history(self, user, limit: int, before=None):
+        """
+        Newest matches of user, limit at most, as a UNION of one keyset scan
+        per player column: each side reads at most limit rows of the
+        (playerN_user, -created_at, -id) index however long the history is.
+        :param before: (created_at, id) of the last match of the previous page
+        """
+        sides = []
+        for fk_field in ('player1_user', 'player2_user'):
+            side = self.filter(**{fk_field: user})
+            if before is not None:
+                created_at, match_id = before
+                side = side.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=match_id))
+            sides.append(side.order_by('-created_at', '-id')[:limit])
+        return sides[0].union(sides[1]).order_by('-created_at', '-id')[:limit]
+
 
 class Match(models.Model):
     player1Name  = models.CharField(max_length=150)
@@ -16,8 +107,59 @@ class Match(models.Model):
     player2Score = models.IntegerField()
     matchType = models.CharField(max_length=150, choices=(('1 vs 1','1 vs 1'),('1 vs AI','1 vs AI'),('multiplyer','multiplyer'),('tournament','tournament')) )      
     winner        = models.CharField(max_length=150)
+    # Registered players behind the names above, null for AI and guest players
+    player1_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='matches_as_player1')
+    player2_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='matches_as_player2')
+    winner_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='matches_won')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MatchQuerySet.as_manager()
+
     def __str__(self):
-        return f"{self.player1Name} vs {self.player2Name} → {self.winner}"
\ No newline at end of file
+        return f"{self.player1Name} vs {self.player2Name} → {self.winner}"
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of match history, newest first
+            models.Index(fields=['-created_at', '-id'], name='match_created_idx'),
+            models.Index(fields=['matchType', '-created_at', '-id'], name='match_type_created_idx'),
+            # Per-player history pages (MatchQuerySet.player_history) and win-count queries
+            models.Index(fields=['player1_user', '-created_at', '-id'], name='match_player1_created_id_idx'),
+            models.Index(fields=['player2_user', '-created_at', '-id'], name='match_player2_created_id_idx'),
+            models.Index(fields=['winner_user', '-created_at'], name='match_winner_created_idx'),
+        ]
+
+class TournamentSubmission(models.Model):
+    """
+    A tournament waiting to be written to the blockchain.
+    Rows are created by the API and worked off by tournaments.submitter.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'pending'), (SENT, 'sent'), (CONFIRMED, 'confirmed'), (FAILED, 'failed'))
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tournament_submissions')
+    name = models.CharField(max_length=150)
+    matches = models.JSONField(default=list)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    nonce = models.PositiveBigIntegerField(null=True, blank=True)
+    tx_hash = models.CharField(max_length=66, null=True, blank=True)
+    tournament_id = models.PositiveIntegerField(null=True, blank=True)
+    # Merkle mode: only this root goes on chain, the matches are stored in Tournament
+    merkle_root = models.CharField(max_length=66, null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Submission {self.id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='submission_due_idx'),
+        ]
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Subquery
+
+# (name column, foreign key column) pairs of Match
+PLAYER_FIELDS = [
+    ('player1Name', 'player1_user'),
+    ('player2Name', 'player2_user'),
+    ('winner', 'winner_user'),
+]
+
+
+def link_players(matches):
+    """
+    Points the player foreign keys of unsaved matches at the users whose
+    username matches the names, with a single query for the whole batch.
+    Names that are not registered users (AI, guests) stay unlinked.
+    :param matches: list of Match instances
+    """
+    names = {getattr(match, name_field) for match in matches for name_field, _ in PLAYER_FIELDS}
+    user_ids = dict(get_user_model().objects.filter(username__in=names).values_list('username', 'id'))
+    for match in matches:
+        for name_field, fk_field in PLAYER_FIELDS:
+            setattr(match, f"{fk_field}_id", user_ids.get(getattr(match, name_field)))
+    return matches
+
+
+def backfill_players(queryset, fk_field, name_field):
+    """
+    Links the rows of queryset that have no user for fk_field yet, in one UPDATE.
+    :return: number of rows updated
+    """
+    same_name = get_user_model().objects.filter(username=OuterRef(name_field))
+    unlinked = queryset.filter(**{f"{fk_field}__isnull": True}).filter(Exists(same_name))
+    return unlinked.update(**{fk_field: Subquery(same_name.values('id')[:1])})
@@ -0,0 +1,167 @@
+"""
+Tournament storage backends.
+
+The views only talk to the backend named by TOURNAMENT_STORAGE_BACKEND:
+
+- ChainStorage queues tournaments for the blockchain (tournaments.submitter)
+  and reads them from the off-chain index (tournaments.indexer)
+- DatabaseStorage keeps tournaments in the Tournament table only
+- MemoryStorage keeps them in process memory, for benchmarks and tests
+
+All backends return tournaments in the shape of block.get_tournaments.
+"""
+import abc
+import functools
+import itertools
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import indexer
+from .merkle import merkle_root
+from .models import Tournament, TournamentSubmission
+
+
+def winner_of(matches: list) -> str:
+    """
+    :return: the tournament winner, taken like the contract does from the last match
+    """
+    return matches[-1]['Winner'] if matches else ''
+
+
+def stored_matches(matches: list) -> list:
+    """
+    :param matches: matches keyed like the contract's Match struct
+    :return: the matches as served by the tournament endpoints
+    """
+    return [{'matchType': 'Tournament', **match} for match in matches]
+
+
+class TournamentStorage(abc.ABC):
+    """
+    Interface of a storage backend.
+    """
+
+    @abc.abstractmethod
+    def submit(self, user, name: str, matches: list) -> dict:
+        """
+        Stores a tournament.
+        :param matches: matches keyed like the contract's Match struct
+        :return: dict with "status" ("pending" if stored asynchronously, then
+                 with "submission_id", otherwise "confirmed" with "tournament_id")
+        """
+
+    @abc.abstractmethod
+    def list(self, name: str, verify: bool = False) -> list:
+        """
+        :return: all tournaments recorded under a name, oldest first
+        """
+
+    @abc.abstractmethod
+    def page(self, name: str, offset: int, limit: int, verify: bool = False):
+        """
+        :return: (total count, one page of the tournaments recorded under a name)
+        """
+
+    def list_many(self, names: list, verify: bool = False) -> dict:
+        """
+        :return: dict name -> all tournaments recorded under that name
+        """
+        return {name: self.list(name, verify=verify) for name in names}
+
+
+class ChainStorage(TournamentStorage):
+    """
+    Writes go to the blockchain through the submission queue, reads come
+    from the off-chain index and can be verified against the chain.
+    """
+
+    def submit(self, user, name, matches):
+        submission = TournamentSubmission.objects.create(
+            user=user,
+            name=name,
+            matches=matches,
+            merkle_root=merkle_root(matches) if settings.TOURNAMENT_STORAGE_MODE == 'merkle' else None
+        )
+        return {'submission_id': submission.id, 'status': submission.status}
+
+    def list(self, name, verify=False):
+        return indexer.user_tournaments(name, verify=verify)
+
+    def page(self, name, offset, limit, verify=False):
+        return indexer.user_tournament_page(name, offset, limit, verify=verify)
+
+    def list_many(self, names, verify=False):
+        return indexer.users_tournaments(names, verify=verify)
+
+
+class DatabaseStorage(TournamentStorage):
+    """
+    Keeps tournaments in the Tournament table without touching the chain.
+    """
+
+    def submit(self, user, name, matches):
+        tournament = Tournament.objects.create(name=name, winner=winner_of(matches), matches=stored_matches(matches))
+        return {'tournament_id': tournament.id, 'status': TournamentSubmission.CONFIRMED}
+
+    def list(self, name, verify=False):
+        return [row.as_dict() for row in indexer.for_name(name)]
+
+    def page(self, name, offset, limit, verify=False):
+        queryset = indexer.for_name(name)
+        return queryset.count(), [row.as_dict() for row in queryset[offset:offset + limit]]
+
+    def list_many(self, names, verify=False):
+        result = {name: [] for name in names}
+        for row in indexer.for_names(names):
+            result[row.name].append(row.as_dict())
+        return result
+
+
+class MemoryStorage(TournamentStorage):
+    """
+    Keeps tournaments in a dict of this process, lost on restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._by_name = {}
+
+    def submit(self, user, name, matches):
+        with self._lock:
+            tournament_id = next(self._ids)
+            self._by_name.setdefault(name, []).append(
+                {'tournament_id': tournament_id, 'winner': winner_of(matches), 'matches': stored_matches(matches)}
+            )
+        return {'tournament_id': tournament_id, 'status': TournamentSubmission.CONFIRMED}
+
+    def list(self, name, verify=False):
+        with self._lock:
+            return list(self._by_name.get(name, []))
+
+    def page(self, name, offset, limit, verify=False):
+        with self._lock:
+            tournaments = self._by_name.get(name, [])
+            return len(tournaments), tournaments[offset:offset + limit]
+
+    def clear(self):
+        with self._lock:
+            self._by_name.clear()
+
+
+def uses_chain() -> bool:
+    """
+    Tells whether the configured backend writes to the blockchain, which
+    needs the submitter and indexer jobs.
+    """
+    return issubclass(import_string(settings.TOURNAMENT_STORAGE_BACKEND), ChainStorage)
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage() -> TournamentStorage:
+    """
+    :return: the process-wide instance of the backend named by TOURNAMENT_STORAGE_BACKEND
+    """
+    return import_string(settings.TOURNAMENT_STORAGE_BACKEND)()
@@ -0,0 +1,269 @@
+"""
+Background writer for TournamentSubmission rows.
+
+The API only stores a submission and answers right away. This module sends
+the pending rows to the contract with locally assigned nonces, so several
+transactions can wait in the pool at once, then follows their receipts.
+Failed sends and reverted transactions are retried with exponential backoff
+until TOURNAMENT_SUBMITTER_MAX_ATTEMPTS is reached.
+
+Under load submissions go out in batches: a cycle waits until BATCH_SIZE
+submissions are due or the oldest one has waited BATCH_WINDOW seconds, then
+sends them in one JSON-RPC batch request, and resolves all receipts of a
+cycle with one read per block. Every submission is still its own
+transaction, the batch saves round trips to the node, not gas.
+
+A cycle runs under a database advisory lock, so one process sends at a time
+however many server processes and run_submitter commands share the account.
+Due rows are claimed with their nonces in a short transaction that commits
+before anything is sent. A claim without a tx_hash, left by a send that
+timed out or a process that died, is sent again with the same nonce, so at
+most one transaction per claim can be mined.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.background import exclusive
+from . import block
+from .models import Tournament, TournamentSubmission
+from .storage import stored_matches, winner_of
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'TOURNAMENT_SUBMITTER_BATCH_SIZE', 20)
+BATCH_WINDOW = getattr(settings, 'TOURNAMENT_SUBMITTER_BATCH_WINDOW', 0)
+MAX_ATTEMPTS = getattr(settings, 'TOURNAMENT_SUBMITTER_MAX_ATTEMPTS', 5)
+BACKOFF = getattr(settings, 'TOURNAMENT_SUBMITTER_BACKOFF', 5)
+MAX_BACKOFF = getattr(settings, 'TOURNAMENT_SUBMITTER_MAX_BACKOFF', 300)
+RECOVERY_BLOCKS = getattr(settings, 'TOURNAMENT_SUBMITTER_RECOVERY_BLOCKS', 1000)
+
+# Advisory lock held by a cycle, and by anything else sending from the account (see bootstrap --redeploy)
+LOCK_NAME = 'tournament-submitter'
+
+# Node errors meaning a transaction with the nonce was sent before
+NONCE_USED_ERRORS = ('nonce too low', 'already known', 'known transaction', 'replacement transaction underpriced')
+
+
+def _claimed():
+    return TournamentSubmission.objects.filter(status=TournamentSubmission.SENT, tx_hash__isnull=True)
+
+
+def in_flight() -> int:
+    """
+    :return: number of submissions claimed or sent and not confirmed yet
+    """
+    return TournamentSubmission.objects.filter(status=TournamentSubmission.SENT).count()
+
+
+def first_free_nonce() -> int:
+    """
+    :return: the node's pending nonce, or the one after the claimed nonces
+             not sent yet, which the node does not know about
+    """
+    claimed = _claimed().aggregate(last=Max('nonce'))['last']
+    return max(block.pending_nonce(), claimed + 1 if claimed is not None else 0)
+
+
+class NonceManager:
+    """
+    Hands out consecutive nonces for the default account without asking the
+    node every time. Synced on first use after every reset, which happens at
+    the start of each cycle and after anything that may have left a gap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = None
+
+    def next(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = first_free_nonce()
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+
+
+nonces = NonceManager()
+
+
+def backoff(attempts: int) -> timedelta:
+    """
+    :return: delay before the next attempt after the given number of attempts
+    """
+    return timedelta(seconds=min(MAX_BACKOFF, BACKOFF * 2 ** max(0, attempts - 1)))
+
+
+def _retry_later(submission: TournamentSubmission, error: str):
+    submission.error = error
+    submission.nonce = None
+    submission.tx_hash = None
+    if submission.attempts >= MAX_ATTEMPTS:
+        submission.status = TournamentSubmission.FAILED
+        logger.error("Tournament submission %s failed after %d attempts: %s", submission.pk, submission.attempts, error)
+    else:
+        submission.status = TournamentSubmission.PENDING
+        submission.next_attempt_at = timezone.now() + backoff(submission.attempts)
+        logger.warning("Tournament submission %s attempt %d failed: %s", submission.pk, submission.attempts, error)
+    submission.save(update_fields=['status', 'attempts', 'error', 'nonce', 'tx_hash', 'next_attempt_at', 'updated_at'])
+
+
+def claim_due() -> list:
+    """
+    Claims the due pending submissions, oldest first: each gets a nonce and
+    is marked sent in a transaction that commits before they are sent.
+    :return: the claimed submissions
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            TournamentSubmission.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=TournamentSubmission.PENDING, next_attempt_at__lte=now)
+            .order_by('id')[:BATCH_SIZE]
+        )
+        if len(due) < BATCH_SIZE and due and now - due[0].created_at < timedelta(seconds=BATCH_WINDOW):
+            # Batch not full yet, give it until the oldest one's window closes
+            return []
+        for submission in due:
+            submission.attempts += 1
+            submission.status = TournamentSubmission.SENT
+            submission.nonce = nonces.next()
+            submission.tx_hash = None
+            submission.error = ''
+            submission.updated_at = now
+        TournamentSubmission.objects.bulk_update(due, ['status', 'attempts', 'nonce', 'tx_hash', 'error', 'updated_at'])
+    return due
+
+
+def _recover(submission: TournamentSubmission, error: Exception):
+    """
+    Finds the hash of a claim whose nonce the node reports as used.
+    :return: transaction hash or None if it is still unknown
+    """
+    tx_hash = block.find_sent_transaction(submission.nonce, RECOVERY_BLOCKS)
+    if tx_hash is None and 'nonce too low' in str(error).lower():
+        # Mined, but too long ago to find; sending again could store the tournament twice
+        submission.status = TournamentSubmission.FAILED
+        submission.error = f"Nonce {submission.nonce} was used by a transaction not found in the last {RECOVERY_BLOCKS} blocks"
+        submission.save(update_fields=['status', 'error', 'updated_at'])
+        logger.error("Tournament submission %s: %s", submission.pk, submission.error)
+    return tx_hash
+
+
+def send_claimed() -> int:
+    """
+    Sends the claimed submissions without a transaction hash, each with its
+    stored nonce, in one JSON-RPC batch request.
+    :return: number of transactions sent
+    """
+    claimed = list(_claimed().order_by('nonce'))
+    if not claimed:
+        return 0
+    try:
+        results = block.send_transactions([
+            {'nonce': submission.nonce, 'merkle_root': submission.merkle_root,
+             'name': submission.name, 'matches': submission.matches}
+            for submission in claimed
+        ])
+    except block.CONNECTION_ERRORS as e:
+        # They may have reached the node, the next cycle sends them again with the same nonces
+        logger.warning("Sending %d tournament submissions failed: %s", len(claimed), e)
+        return 0
+    sent = 0
+    for submission, result in zip(claimed, results):
+        tx_hash = result
+        if isinstance(result, Exception):
+            if not any(message in str(result).lower() for message in NONCE_USED_ERRORS):
+                # Rejected by the node, the nonce is free again
+                nonces.reset()
+                _retry_later(submission, str(result))
+                continue
+            tx_hash = _recover(submission, result)
+            if tx_hash is None:
+                continue
+        submission.tx_hash = tx_hash
+        submission.save(update_fields=['tx_hash', 'updated_at'])
+        sent += 1
+    return sent
+
+
+def check_receipts() -> int:
+    """
+    Resolves sent submissions whose transaction has been mined.
+    :return: number of submissions confirmed
+    """
+    confirmed = 0
+    submissions = list(
+        TournamentSubmission.objects
+        .filter(status=TournamentSubmission.SENT, tx_hash__isnull=False)
+        .order_by('nonce')
+    )
+    if not submissions:
+        return 0
+    receipts = block.tournament_receipts([submission.tx_hash for submission in submissions])
+    for submission in submissions:
+        receipt = receipts.get(submission.tx_hash)
+        if receipt is None:
+            if not block.is_transaction_known(submission.tx_hash):
+                # Dropped from the pool, its nonce is free again
+                nonces.reset()
+                _retry_later(submission, "Transaction was dropped by the node")
+            continue
+        if not receipt['success']:
+            _retry_later(submission, f"Transaction reverted in block {receipt['block_number']}")
+            continue
+        with transaction.atomic():
+            submission.status = TournamentSubmission.CONFIRMED
+            submission.tournament_id = receipt['tournament_id']
+            submission.error = ''
+            submission.save(update_fields=['status', 'tournament_id', 'error', 'updated_at'])
+            if submission.merkle_root:
+                store_committed(submission, receipt['block_number'])
+        block.invalidate_tournaments(submission.name)
+        confirmed += 1
+    return confirmed
+
+
+def store_committed(submission: TournamentSubmission, block_number: int) -> Tournament:
+    """
+    Stores the full tournament of a confirmed Merkle commitment.
+    """
+    return Tournament.objects.create(
+        name=submission.name,
+        winner=winner_of(submission.matches),
+        matches=stored_matches(submission.matches),
+        block_number=block_number,
+        tx_hash=submission.tx_hash,
+        merkle_root=submission.merkle_root,
+    )
+
+
+def process_submissions():
+    """
+    One submitter cycle, the entry point of the periodic job started in
+    TournamentsConfig.ready and of the run_submitter command. Skipped while
+    another process runs one.
+    :return: (sent, confirmed)
+    """
+    with exclusive(LOCK_NAME) as acquired:
+        if not acquired:
+            return 0, 0
+        # Another process may have sent since this one last did
+        nonces.reset()
+        confirmed = check_receipts()
+        claim_due()
+        sent = send_claimed()
+    if sent or confirmed:
+        logger.info("Tournament submitter sent %d and confirmed %d transactions", sent, confirmed)
+    return sent, confirmed
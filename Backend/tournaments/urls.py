@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import (MatchCreateView, TournamentCreateView, TournamentListView)
+from .views import (MatchCreateView, MatchBulkCreateView, TournamentCreateView, TournamentSubmissionStatusView, TournamentListView,
+                    PlayersTournamentListView,
+                    TournamentMatchProofView, TournamentCacheStatsView)
 
 urlpatterns = [
     path('match/', MatchCreateView.as_view(), name='match-list-create'),
+    path('match/bulk/', MatchBulkCreateView.as_view(), name='match-bulk-create'),
     path('tournament/', TournamentCreateView.as_view(), name='tournament-list-create'),
-    path('tournament/list/' , TournamentListView.as_view(), name='tournament-list')
+    path('tournament/submission/<int:submission_id>/', TournamentSubmissionStatusView.as_view(), name='tournament-submission-status'),
+    path('tournament/list/' , TournamentListView.as_view(), name='tournament-list'),
+    path('tournament/<int:pk>/proof/<int:index>/', TournamentMatchProofView.as_view(), name='tournament-match-proof'),
+    path('tournament/list/players/', PlayersTournamentListView.as_view(), name='tournament-list-players'),
+    path('tournament/cache/', TournamentCacheStatsView.as_view(), name='tournament-cache-stats')
 ]
@@ -1,13 +1,22 @@
 from rest_framework.views    import APIView
 from rest_framework.response import Response
 from rest_framework          import status
-from .models                 import Tournament, Match
+from .models                 import Tournament, Match, TournamentSubmission
 from users.authentication import JWTCookieAuthentication
 from rest_framework import permissions
-from .block import save_tournament, get_tournaments
+from .storage import get_storage
+from .block import tournament_cache_stats, committed_root
+from .merkle import InvalidMatch, merkle_proof, leaf_hash, verify_proof
+from web3 import Web3
 # from ...Blockchain.views import get_blockchain
 from django.http import QueryDict
+from django.db import transaction
 from users.models import User
+from users.stats import record_match, record_matches
+from .players import link_players
+from .parsers import NDJSONParser
+from .serializers import MatchSerializer
+from rest_framework.parsers import JSONParser
 
 class MatchCreateView(APIView):
     authentication_classes = [JWTCookieAuthentication]
@@ -26,7 +35,7 @@ class MatchCreateView(APIView):
     def post(self, request):
         data = request.data
         print("data", data)
-        m = Match.objects.create(
+        m = Match(
             player1Name  = data['player1Name'],
             player2Name  = data['player2Name'],
             player1Score = data['player1Score'],
@@ -34,10 +43,45 @@ class MatchCreateView(APIView):
             winner        = data['winner'],
             matchType = data['matchType']
         )
-        User.objects.filter(username=request.user.username)[0].matchHistory.add(m)
-        User.objects.filter(username=request.user.username)[0].update_stats()
+        link_players([m])
+        with transaction.atomic():
+            m.save()
+            request.user.matchHistory.add(m)
+            record_match(m)
         return Response({'match_id': m.id}, status=status.HTTP_201_CREATED)
 
+
+class MatchBulkCreateView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    max_matches = 1000
+
+    """
+    POST /match/bulk/
+    a JSON array of matches, or application/x-ndjson with one match per line,
+    oldest first, each with the fields of POST /match/
+    all matches are inserted in one transaction and the stats of each
+    registered player are updated once for the whole batch
+    """
+    def post(self, request):
+        data = request.data
+        if not isinstance(data, list) or not data:
+            return Response({'error': 'Expected a non-empty list of matches'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(data) > self.max_matches:
+            return Response({'error': f'At most {self.max_matches} matches per request'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = MatchSerializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        matches = link_players([Match(**fields) for fields in serializer.validated_data])
+        user = request.user
+        with transaction.atomic():
+            matches = Match.objects.bulk_create(matches)
+            Through = User.matchHistory.through
+            Through.objects.bulk_create([Through(user_id=user.pk, match_id=m.pk) for m in matches])
+            record_matches(matches)
+        return Response({'match_ids': [m.pk for m in matches]}, status=status.HTTP_201_CREATED)
+
  
 class TournamentCreateView(APIView):
     authentication_classes = [JWTCookieAuthentication]
@@ -87,21 +131,134 @@ class TournamentCreateView(APIView):
             }
             for match in data
         ]
-      print("username", request.user.username)
-      id = save_tournament(tournament_name=request.user.username, matches=matches)
-      User.objects.filter(username=request.user.username)[0].update_stats()
+      # 2. hand it to the storage backend, the chain backend only queues it
+      try:
+          result = get_storage().submit(request.user, request.user.username, matches)
+      except InvalidMatch as e:
+          return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
       return Response(
-          {
-              'tournament_id': id
-          },
-          status=status.HTTP_201_CREATED
+          result,
+          status=status.HTTP_202_ACCEPTED if result['status'] == TournamentSubmission.PENDING else status.HTTP_201_CREATED
       )
 
 
+class PlayersTournamentListView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    max_names = 50
+
+    """
+    GET /tournament/list/players/?names=alice,bob
+    tournaments of several players at once (lobbies, brackets),
+    keyed by player, ?verify=true as for /tournament/list/
+    """
+    def get(self, request):
+        names = [name for name in request.query_params.get('names', '').split(',') if name]
+        if not names:
+            return Response({'error': 'names is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(names) > self.max_names:
+            return Response({'error': f'At most {self.max_names} names per request'}, status=status.HTTP_400_BAD_REQUEST)
+        verify = request.query_params.get('verify', '').lower() in ('1', 'true')
+        return Response(get_storage().list_many(list(dict.fromkeys(names)), verify=verify), status=status.HTTP_200_OK)
+
+
+class TournamentSubmissionStatusView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    """
+    GET /tournament/submission/<id>/
+    progress of a tournament queued by POST /tournament/,
+    tournament_id is set once the transaction is confirmed
+    """
+    def get(self, request, submission_id):
+        submission = TournamentSubmission.objects.filter(pk=submission_id, user=request.user).first()
+        if submission is None:
+            return Response({'error': 'Submission not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            {
+                'submission_id': submission.id,
+                'status': submission.status,
+                'tournament_id': submission.tournament_id,
+                'tx_hash': submission.tx_hash,
+                'merkle_root': submission.merkle_root,
+                'attempts': submission.attempts,
+                'error': submission.error
+            },
+            status=status.HTTP_200_OK
+        )
+
+
 class TournamentListView(APIView):
     authentication_classes = [JWTCookieAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    max_limit = 100
+
+    """
+    GET /tournament/list/
+    the user's tournaments from the off-chain index,
+    ?verify=true also reads them from the chain and serves those if they differ
+    with offset and/or limit returns one page as {"count", "results"}
+    """
+    def get(self, request):
+        verify = request.query_params.get('verify', '').lower() in ('1', 'true')
+        if 'offset' in request.query_params or 'limit' in request.query_params:
+            try:
+                offset = max(0, int(request.query_params.get('offset', 0)))
+                limit = min(self.max_limit, max(1, int(request.query_params.get('limit', self.max_limit))))
+            except ValueError:
+                return Response({'error': 'offset and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            count, page = get_storage().page(request.user.username, offset, limit, verify=verify)
+            return Response({'count': count, 'results': page}, status=status.HTTP_200_OK)
+        tournaments = get_storage().list(request.user.username, verify=verify)
+        return Response(tournaments, status=status.HTTP_200_OK)
+
+
+class TournamentMatchProofView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    """
+    GET /tournament/<id>/proof/<index>/
+    Merkle proof of one match of a tournament committed in merkle mode,
+    "verified" tells whether the proof folds into the root read from the chain,
+    422 if the stored matches cannot be hashed
+    """
+    def get(self, request, pk, index):
+        tournament = Tournament.objects.filter(pk=pk).exclude(merkle_root=None).first()
+        if tournament is None:
+            return Response({'error': 'Tournament not found'}, status=status.HTTP_404_NOT_FOUND)
+        if index >= len(tournament.matches):
+            return Response({'error': 'Match not found'}, status=status.HTTP_404_NOT_FOUND)
+        match = tournament.matches[index]
+        try:
+            proof = merkle_proof(tournament.matches, index)
+            leaf = leaf_hash(match)
+        except InvalidMatch as e:
+            return Response({'error': f'Invalid match data: {e}'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        chain_root = committed_root(tournament.tx_hash)
+        return Response(
+            {
+                'tournament': tournament.id,
+                'match': match,
+                'leaf': Web3.to_hex(leaf),
+                'proof': proof,
+                'merkle_root': tournament.merkle_root,
+                'tx_hash': tournament.tx_hash,
+                'block_number': tournament.block_number,
+                'verified': chain_root is not None and verify_proof(match, proof, chain_root)
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class TournamentCacheStatsView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    """
+    GET /tournament/cache/
+    counters of this process' cache of on-chain tournament reads
+    """
     def get(self, request):
-        tournaments = get_tournaments(request.user.username)
-        return Response(tournaments, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(tournament_cache_stats(), status=status.HTTP_200_OK)
@@ -23,6 +23,6 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(RevokedAccessToken)
 class RevokedAccessTokenAdmin(admin.ModelAdmin):
-    list_display = ('token', 'user', 'revoked_at')
+    list_display = ('token', 'user', 'revoked_at', 'expires_at')
     search_fields = ('token', 'user__username')
     list_filter = ('revoked_at',)
\ No newline at end of file
@@ -1,6 +1,31 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+def create_trigram_extension(using, **kwargs):
+    """
+    The username trigram index needs pg_trgm, created before the users
+    migrations run since those are generated by makemigrations.
+    """
+    from django.db import connections
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        pre_migrate.connect(create_trigram_extension, sender=self)
+        from core.background import start_periodic_job
+        from .compaction import run_scheduled_compaction
+        from .leaderboard import REBUILD_INTERVAL as LEADERBOARD_REBUILD_INTERVAL, leaderboard
+        from .revocation import REBUILD_INTERVAL, convert_legacy_rows, revocation_list
+        post_migrate.connect(convert_legacy_rows, sender=self)
+        start_periodic_job('token-compaction', getattr(settings, 'TOKEN_COMPACTION_INTERVAL', 0), run_scheduled_compaction)
+        start_periodic_job('revocation-rebuild', REBUILD_INTERVAL, revocation_list.rebuild)
+        start_periodic_job('leaderboard-rebuild', LEADERBOARD_REBUILD_INTERVAL, leaderboard.rebuild)
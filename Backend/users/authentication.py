@@ -1,13 +1,16 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.conf import settings
-from .models import RevokedAccessToken # Import our custom model
+from rest_framework_simplejwt.settings import api_settings
+from .revocation import revocation_list # In-process view of the RevokedAccessToken table
+from .tokens import token_version_of
 from rest_framework_simplejwt.exceptions import InvalidToken # Import InvalidToken for exception handling
 
 class JWTCookieAuthentication(JWTAuthentication):
     """
     Custom JWT authentication class that extracts tokens from cookies if they exist,
     falling back to the standard Authorization header if not.
-    Checks custom RevokedAccessToken list.
+    Checks the jti of the token against the revocation list and its
+    token_version claim against the user's current one.
     """
     
     def authenticate(self, request):
@@ -22,20 +25,21 @@ class JWTCookieAuthentication(JWTAuthentication):
             else:
                 return super().authenticate(request)
 
-        
-        # Print all revoked tokens for comparison
-        revoked_tokens = list(RevokedAccessToken.objects.values_list('token', flat=True))
-
-        # --- Check Revocation List FIRST ---
-        if RevokedAccessToken.objects.filter(token=raw_token).exists():
-            return None
-        # --- End Revocation Check ---
-
-        # If not revoked, proceed with standard validation (signature, expiry)
+        # Standard validation first (signature, expiry), it gives us the jti
         try:
             validated_token = self.get_validated_token(raw_token)
         except InvalidToken:
             return None 
 
-        # Token is valid (signature, expiry) AND not found in our revocation list
-        return self.get_user(validated_token), validated_token
\ No newline at end of file
+        # --- Check Revocation List ---
+        if revocation_list.is_revoked(validated_token[api_settings.JTI_CLAIM]):
+            return None
+        # --- End Revocation Check ---
+
+        # get_user loads the user row anyway, so the version check is one integer comparison
+        user = self.get_user(validated_token)
+        if token_version_of(validated_token) != user.token_version:
+            return None
+
+        # Token is valid (signature, expiry), not found in our revocation list and not logged out everywhere
+        return user, validated_token
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Deletes token bookkeeping rows that can no longer matter because the token
+they describe has expired on its own.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import RevokedAccessToken
+
+logger = logging.getLogger(__name__)
+
+
+def expired_querysets():
+    """
+    :return: list of (label, queryset of expired rows), children before parents
+    """
+    now = timezone.now()
+    access_lifetime = settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']
+    return [
+        ('revoked access tokens', RevokedAccessToken.objects.filter(
+            Q(expires_at__lte=now) | Q(expires_at__isnull=True, revoked_at__lte=now - access_lifetime)
+        )),
+        ('blacklisted tokens', BlacklistedToken.objects.filter(token__expires_at__lte=now)),
+        ('outstanding tokens', OutstandingToken.objects.filter(expires_at__lte=now)),
+    ]
+
+
+def compact_expired_tokens(batch_size: int = 1000, max_batches: int = None) -> list:
+    """
+    Deletes expired rows in batches of at most batch_size rows so no single
+    statement holds locks for long.
+    :param batch_size: rows deleted per statement
+    :param max_batches: stop after this many batches per table (None = until done)
+    :return: list of {"table", "rows", "seconds"} dicts, one per batch
+    """
+    report = []
+    for label, queryset in expired_querysets():
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            started = time.monotonic()
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            queryset.model.objects.filter(pk__in=pks).delete()
+            elapsed = time.monotonic() - started
+            report.append({'table': label, 'rows': len(pks), 'seconds': elapsed})
+            logger.info("Compacted %d %s in %.3fs", len(pks), label, elapsed)
+            batches += 1
+            if len(pks) < batch_size:
+                break
+    return report
+
+
+def run_scheduled_compaction():
+    """
+    Entry point of the periodic in-process job started in UsersConfig.ready.
+    """
+    report = compact_expired_tokens(
+        batch_size=getattr(settings, 'TOKEN_COMPACTION_BATCH_SIZE', 1000),
+        max_batches=getattr(settings, 'TOKEN_COMPACTION_MAX_BATCHES', 10),
+    )
+    if report:
+        logger.info("Token compaction reclaimed %d rows", sum(batch['rows'] for batch in report))
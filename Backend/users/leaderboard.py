@@ -0,0 +1,192 @@
+"""
+In-memory leaderboard ordered by win rate, then wins.
+
+The ordering lives in a SortedList, so moving a user and looking up a
+position are O(log n). It is updated incrementally whenever a user's stats
+change and rebuilt from the database by the 'leaderboard-rebuild'
+background job every LEADERBOARD_REBUILD_INTERVAL seconds, to pick up
+changes made by other processes. Updates arriving while a rebuild reads the
+database are replayed onto the new ordering before it is swapped in. Until
+the first build is done the database answers.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from sortedcontainers import SortedList
+
+from .models import User
+from .signals import stats_updated
+
+logger = logging.getLogger(__name__)
+
+REBUILD_INTERVAL = getattr(settings, 'LEADERBOARD_REBUILD_INTERVAL', 300)
+
+
+def _sort_key(user_id, win_rate, wins):
+    # Best first; the id breaks ties so every key is unique
+    return (-win_rate, -wins, user_id)
+
+
+def _ranked_users():
+    return User.objects.filter(total_games__gt=0)
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = None
+        self._by_user = {}
+        self._pending = None  # user_id -> new key (None when removed) while a rebuild runs
+        self._initial_build = None
+
+    def rebuild(self):
+        """
+        Builds a new ordering from the database and swaps it in. Runs in the
+        background, requests keep using the current ordering meanwhile.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = {}
+        try:
+            rows = _ranked_users().values_list('id', 'win_rate', 'wins')
+            by_user = {user_id: _sort_key(user_id, rate, wins) for user_id, rate, wins in rows.iterator()}
+            keys = SortedList(by_user.values())
+            with self._lock:
+                for user_id, key in self._pending.items():
+                    old = by_user.pop(user_id, None)
+                    if old is not None:
+                        keys.remove(old)
+                    if key is not None:
+                        by_user[user_id] = key
+                        keys.add(key)
+                self._by_user = by_user
+                self._keys = keys
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _start_initial_build(self):
+        with self._lock:
+            if self._initial_build is not None:
+                return
+            self._initial_build = threading.Thread(target=self._run_initial_build, name='leaderboard-build', daemon=True)
+            self._initial_build.start()
+
+    def _run_initial_build(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Building the leaderboard failed")
+            with self._lock:
+                self._initial_build = None
+        finally:
+            close_old_connections()
+
+    def _built(self) -> bool:
+        if self._keys is None:
+            self._start_initial_build()
+            return False
+        return True
+
+    def _set(self, user_id, key):
+        # Called with self._lock held
+        if self._pending is not None:
+            self._pending[user_id] = key
+        if self._keys is None:
+            return
+        old = self._by_user.pop(user_id, None)
+        if old is not None:
+            self._keys.remove(old)
+        if key is not None:
+            self._by_user[user_id] = key
+            self._keys.add(key)
+
+    def update(self, user_id, win_rate, wins, total_games):
+        """
+        Moves a user to the position matching their new stats.
+        Users without any game are not ranked.
+        """
+        key = _sort_key(user_id, win_rate, wins) if total_games > 0 else None
+        with self._lock:
+            self._set(user_id, key)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._set(user_id, None)
+
+    def count(self) -> int:
+        if not self._built():
+            return _ranked_users().count()
+        return len(self._keys)
+
+    def top(self, offset: int = 0, limit: int = 100) -> list:
+        """
+        :return: list of (position, user_id), positions start at 1
+        """
+        if not self._built():
+            ids = _ranked_users().order_by('-win_rate', '-wins', 'id').values_list('id', flat=True)
+            return [(offset + i + 1, user_id) for i, user_id in enumerate(ids[offset:offset + limit])]
+        with self._lock:
+            keys = list(self._keys.islice(offset, offset + limit))
+        return [(offset + i + 1, key[2]) for i, key in enumerate(keys)]
+
+    def position(self, user_id):
+        """
+        :return: 1-based position of the user or None if unranked
+        """
+        if not self._built():
+            user = _ranked_users().filter(pk=user_id).values('win_rate', 'wins').first()
+            if user is None:
+                return None
+            rate, wins = user['win_rate'], user['wins']
+            return _ranked_users().filter(
+                Q(win_rate__gt=rate) | Q(win_rate=rate, wins__gt=wins) | Q(win_rate=rate, wins=wins, id__lt=user_id)
+            ).count() + 1
+        with self._lock:
+            key = self._by_user.get(user_id)
+            if key is None:
+                return None
+            return self._keys.index(key) + 1
+
+    def around(self, user_id, radius: int = 5) -> list:
+        """
+        :return: the user and up to radius neighbours on each side, as (position, user_id)
+        """
+        if not self._built():
+            # Database queries, made without holding the lock
+            position = self.position(user_id)
+            if position is None:
+                return []
+            offset = max(0, position - 1 - radius)
+            return self.top(offset, position - offset + radius)
+        with self._lock:
+            key = self._by_user.get(user_id)
+            if key is None:
+                return []
+            position = self._keys.index(key) + 1
+            offset = max(0, position - 1 - radius)
+            keys = list(self._keys.islice(offset, position + radius))
+        return [(offset + i + 1, key[2]) for i, key in enumerate(keys)]
+
+
+leaderboard = Leaderboard()
+
+
+@receiver(stats_updated, sender=User)
+def update_leaderboard(sender, user_id, **kwargs):
+    row = User.objects.filter(pk=user_id).values_list('win_rate', 'wins', 'total_games').first()
+    if row is None:
+        leaderboard.remove(user_id)
+    else:
+        leaderboard.update(user_id, *row)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    leaderboard.remove(instance.pk)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.compaction import compact_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired revoked, outstanding and blacklisted token rows in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per statement.")
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches per table.")
+
+    def handle(self, *args, **options):
+        report = compact_expired_tokens(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        totals = {}
+        for batch in report:
+            self.stdout.write(f"{batch['table']}: deleted {batch['rows']} rows in {batch['seconds'] * 1000:.1f} ms")
+            totals[batch['table']] = totals.get(batch['table'], 0) + batch['rows']
+        for table, rows in totals.items():
+            self.stdout.write(self.style.SUCCESS(f"Reclaimed {rows} {table}"))
+        if not report:
+            self.stdout.write("Nothing to compact")
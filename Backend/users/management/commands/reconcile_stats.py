@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Func, IntegerField, OuterRef, Subquery
+from django.utils import timezone
+
+from tournaments.models import Match
+from users.models import User
+from users.signals import stats_updated
+from users.stats import rank_for_wins, rebuild_mode_stats, win_rate
+
+STATS_FIELDS = ['total_games', 'wins', 'losses', 'win_rate', 'rank']
+
+
+def count_of(matches):
+    """
+    Correlated COUNT(*) subquery over matches, for annotating users.
+    """
+    return Subquery(
+        matches.order_by().annotate(n=Func('id', function='COUNT')).values('n'),
+        output_field=IntegerField(),
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuilds every user's game counters and per-mode rollups from the matches they played."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Users read and written per batch.")
+        parser.add_argument('--skip-rollups', action='store_true', help="Only rebuild the counters on User.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Both counts read the per-player (playerN_user, created_at, id) indexes
+        played = Match.objects.for_player(OuterRef('pk'))
+        users = User.objects.annotate(
+            games=count_of(played),
+            won=count_of(played.won_by(OuterRef('pk'))),
+        ).only('id', *STATS_FIELDS).order_by('id')
+
+        seen = 0
+        pending = []
+        changed_ids = []
+        for user in users.iterator(chunk_size=batch_size):
+            seen += 1
+            if not options['skip_rollups']:
+                rebuild_mode_stats(user)
+            stats = (user.games, user.won, user.games - user.won, win_rate(user.won, user.games), rank_for_wins(user.won))
+            if stats == tuple(getattr(user, field) for field in STATS_FIELDS):
+                continue
+            for field, value in zip(STATS_FIELDS, stats):
+                setattr(user, field, value)
+            # bulk_update does not apply auto_now
+            user.updated_at = timezone.now()
+            pending.append(user)
+            changed_ids.append(user.pk)
+            if len(pending) >= batch_size:
+                User.objects.bulk_update(pending, STATS_FIELDS + ['updated_at'])
+                pending = []
+        if pending:
+            User.objects.bulk_update(pending, STATS_FIELDS + ['updated_at'])
+
+        for user_id in changed_ids:
+            stats_updated.send(sender=User, user_id=user_id)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {seen} users, {len(changed_ids)} had drifted"))
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from tournaments.models import Match
@@ -18,6 +21,9 @@ class User(AbstractUser):
     # 2FA fields
     is_two_factor_enabled = models.BooleanField(default=False)
 
+    # Bumped to invalidate every token issued to the user (see users/tokens.py)
+    token_version = models.PositiveIntegerField(default=0)
+
     # Game related fields
     total_games = models.IntegerField(default=0)
     wins = models.IntegerField(default=0)
@@ -26,40 +32,96 @@ class User(AbstractUser):
     matchHistory = models.ManyToManyField(Match, blank=True, related_name="matchHistory")
     rank = models.CharField(max_length=100, blank=True, null=True)
 
+    # Hash of the Elasticsearch document as last indexed, None when unknown (see elk/bulk.py)
+    search_hash = models.CharField(max_length=32, blank=True, null=True, editable=False)
+
+    # Last change to any field, set by the bulk updates of users.stats too (reindex catches up from it)
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
+
     def update_stats(self):
-        self.total_games = self.matchHistory.count()
-        self.wins = self.matchHistory.filter(winner=self.username).count()
+        """
+        Recomputes the game counters from every match the user played.
+        Matches are counted incrementally by users.stats.record_match, this
+        is only needed to repair drifted counters (see reconcile_stats).
+        """
+        from .stats import rank_for_wins, win_rate
+        played = Match.objects.for_player(self)
+        self.total_games = played.count()
+        self.wins = played.won_by(self).count()
         self.losses = self.total_games - self.wins
-        self.win_rate = round((self.wins / self.total_games) * 100, 2) if self.total_games > 0 else 0.0
-        if self.wins < 5:
-            self.rank = "Bronze"
-        elif self.wins < 10:
-            self.rank = "Silver"
-        elif self.wins < 20:
-            self.rank = "Gold"
-        elif self.wins < 50:
-            self.rank = "Platinum"
-        elif self.wins < 100:
-            self.rank = "Diamond"
-        else:
-            self.rank = "Master"
+        self.win_rate = win_rate(self.wins, self.total_games)
+        self.rank = rank_for_wins(self.wins)
         self.save()
+
+    def revoke_all_tokens(self):
+        """
+        Logs the user out everywhere by bumping token_version.
+        Tokens carrying an older version are rejected on their next use.
+        """
+        User.objects.filter(pk=self.pk).update(token_version=F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
     
     def __str__(self):
         return self.username
 
+    class Meta:
+        indexes = [
+            # Username search when Elasticsearch is down (elk/search.py), needs pg_trgm (see users/apps.py)
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), name='user_username_trgm_idx'),
+        ]
+
+
+class PlayerModeStats(models.Model):
+    """
+    Rollup of a user's results per match type, maintained by users.stats as
+    matches are recorded. The row with matchType "all" covers every mode.
+    """
+    ALL_MODES = "all"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mode_stats")
+    matchType = models.CharField(max_length=150)
+    games = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    points_for = models.IntegerField(default=0)
+    points_against = models.IntegerField(default=0)
+    # Positive for a run of wins, negative for a run of losses
+    current_streak = models.IntegerField(default=0)
+    best_win_streak = models.IntegerField(default=0)
+
+    @property
+    def losses(self):
+        return self.games - self.wins
+
+    @property
+    def win_rate(self):
+        return round((self.wins / self.games) * 100, 2) if self.games > 0 else 0.0
+
+    @property
+    def average_margin(self):
+        return round((self.points_for - self.points_against) / self.games, 2) if self.games > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.user_id} {self.matchType}: {self.wins}/{self.games}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'matchType'], name='unique_player_mode_stats'),
+        ]
+
 
 
 class RevokedAccessToken(models.Model):
     """
-    Stores the entire string of access tokens that have been revoked
-    before their expiry time.
+    Stores the jti of access tokens that have been revoked before their expiry
+    time. A row is only useful until expires_at, after that the token is
+    rejected by its own exp claim anyway.
+
+    The jti lives in the "token" column, which used to hold the full token
+    string: keeping the primary key lets makemigrations extend existing
+    tables without a prompt. Rows from before are converted by
+    users.revocation.convert_legacy_rows after migrate.
     """
-    # Store the full token string. It's long, so use TextField.
-    # Making it primary key might be inefficient for large text fields,
-    # but ensures uniqueness directly. Consider adding a separate auto-incrementing ID
-    # and a unique constraint on 'token' for better performance if needed later.
-    token = models.TextField(unique=True, primary_key=True, help_text="The full string of the revoked JWT Access Token.")
+    token = models.TextField(unique=True, primary_key=True, help_text="The jti claim of the revoked JWT Access Token.")
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, # Link to the user who owned the token
         on_delete=models.CASCADE,
@@ -67,7 +129,8 @@ class RevokedAccessToken(models.Model):
         null=True, # Allow null if user info isn't critical or available
         blank=True
     )
-    revoked_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp when the token was revoked.")
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="Expiry of the revoked token, copied from its exp claim.")
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text="Timestamp when the token was revoked.")
 
     def __str__(self):
         return f"Revoked token for user {self.user_id}: {self.token}"
@@ -75,4 +138,4 @@ class RevokedAccessToken(models.Model):
     class Meta:
         verbose_name = "Revoked Access Token"
         verbose_name_plural = "Revoked Access Tokens"
-        ordering = ['-revoked_at']
\ No newline at end of file
+        ordering = ['-revoked_at']
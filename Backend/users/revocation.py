@@ -0,0 +1,202 @@
+"""
+In-process revocation list for access tokens, keyed by the token's jti.
+
+Every process keeps a bloom filter of the jtis revoked in the database and a
+TTL-bounded LRU of confirmed lookups. Most tokens were never revoked, so the
+bloom filter answers them without touching the database. Requests sync the
+filter incrementally every REVOCATION_SYNC_INTERVAL seconds. The full
+rebuild from the unexpired rows, which is also what drops jtis whose token
+has passed its exp, runs in the 'revocation-rebuild' background job every
+REVOCATION_REBUILD_INTERVAL seconds; until the first build is done lookups
+go to the LRU and the database.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import jwt
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from core.cache import TTLCache
+from .models import RevokedAccessToken
+
+logger = logging.getLogger(__name__)
+
+BLOOM_CAPACITY = getattr(settings, 'REVOCATION_BLOOM_CAPACITY', 100_000)
+BLOOM_ERROR_RATE = getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.001)
+CACHE_SIZE = getattr(settings, 'REVOCATION_CACHE_SIZE', 10_000)
+SYNC_INTERVAL = getattr(settings, 'REVOCATION_SYNC_INTERVAL', 5)
+REBUILD_INTERVAL = getattr(settings, 'REVOCATION_REBUILD_INTERVAL', 600)
+
+# Rows are stamped with revoked_at before their transaction commits, so the
+# incremental sync looks back a little to catch late commits.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter using double hashing over a single blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _seconds_left(expires_at) -> float:
+    if expires_at is None:
+        return settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+    return (expires_at - timezone.now()).total_seconds()
+
+
+class RevocationList:
+    """
+    Answers "is this jti revoked?" in O(1), usually without a database query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._cache = TTLCache(maxsize=CACHE_SIZE)
+        self._synced_until = None
+        self._next_sync = 0.0
+        self._building = None  # jtis revoked in this process while a rebuild runs
+        self._initial_build = None
+
+    def rebuild(self):
+        """
+        Builds a new filter from the unexpired rows and swaps it in. Runs in
+        the background, requests keep using the current filter meanwhile.
+        """
+        with self._lock:
+            if self._building is not None:
+                return
+            self._building = []
+        try:
+            started_at = timezone.now()
+            bloom = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+            rows = RevokedAccessToken.objects.filter(Q(expires_at__gt=started_at) | Q(expires_at__isnull=True))
+            for jti, expires_at in rows.values_list('token', 'expires_at').iterator():
+                bloom.add(jti)
+                self._cache.set(jti, True, ttl=_seconds_left(expires_at))
+            with self._lock:
+                # Revoked here while the rows were read; other processes' are caught by the next sync
+                for jti in self._building:
+                    bloom.add(jti)
+                self._bloom = bloom
+                self._synced_until = started_at
+                self._next_sync = 0.0
+        finally:
+            with self._lock:
+                self._building = None
+
+    def _start_initial_build(self):
+        with self._lock:
+            if self._initial_build is not None:
+                return
+            self._initial_build = threading.Thread(target=self._run_initial_build, name='revocation-build', daemon=True)
+            self._initial_build.start()
+
+    def _run_initial_build(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Building the revocation filter failed")
+            with self._lock:
+                self._initial_build = None
+        finally:
+            close_old_connections()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._bloom is None or now < self._next_sync:
+            return
+        with self._lock:
+            if now < self._next_sync:
+                return
+            started_at = timezone.now()
+            rows = RevokedAccessToken.objects.filter(revoked_at__gte=self._synced_until - SYNC_OVERLAP)
+            for jti, expires_at in rows.values_list('token', 'expires_at').iterator():
+                self._bloom.add(jti)
+                self._cache.set(jti, True, ttl=_seconds_left(expires_at))
+            self._synced_until = started_at
+            self._next_sync = now + SYNC_INTERVAL
+
+    def is_revoked(self, jti: str) -> bool:
+        """
+        Checks whether the access token with the given jti has been revoked.
+        :param jti: jti claim of an already validated (unexpired) access token
+        :return: True if the token must be rejected
+        """
+        if self._bloom is None:
+            self._start_initial_build()
+        else:
+            self._sync()
+            if jti not in self._bloom:
+                return False
+        cached = self._cache.get(jti)
+        if cached is not None:
+            return cached
+        # Bloom filter false positive, an entry evicted from the LRU or no filter yet
+        row = RevokedAccessToken.objects.filter(token=jti).values_list('expires_at', flat=True).first()
+        self._cache.set(jti, row is not None, ttl=_seconds_left(row) if row else SYNC_INTERVAL)
+        return row is not None
+
+    def revoke(self, jti: str, exp: int, user=None):
+        """
+        Revokes an access token until its own expiry.
+        :param jti: jti claim of the token
+        :param exp: exp claim of the token (seconds since epoch)
+        :param user: owner of the token
+        """
+        expires_at = datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+        RevokedAccessToken.objects.get_or_create(token=jti, defaults={'user': user, 'expires_at': expires_at})
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            if self._building is not None:
+                self._building.append(jti)
+        self._cache.set(jti, True, ttl=_seconds_left(expires_at))
+
+
+revocation_list = RevocationList()
+
+
+def convert_legacy_rows(**kwargs):
+    """
+    Rewrites rows stored before revocation went by jti, whose primary key is
+    the full access token, into jti rows. Connected to post_migrate.
+    """
+    legacy = RevokedAccessToken.objects.filter(token__contains='.')
+    for row in legacy.iterator():
+        try:
+            # Stored by this server after validating it, only the claims are needed
+            claims = jwt.decode(row.token, options={'verify_signature': False, 'verify_exp': False})
+        except jwt.InvalidTokenError:
+            claims = {}
+        expires_at = datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc) if 'exp' in claims else None
+        if claims.get('jti') and expires_at and expires_at > timezone.now():
+            RevokedAccessToken.objects.get_or_create(
+                token=claims['jti'], defaults={'user_id': row.user_id, 'expires_at': expires_at}
+            )
+        row.delete()
@@ -1,15 +1,50 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import User
-from tournaments.serializers import MatchSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import User, PlayerModeStats
+from .tokens import VersionedRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
+    """
+    Identity and summary stats only, the one shape returned by login, the
+    42 callback and /me. Match history and tournaments have their own
+    paginated endpoints, the stats are only moved by users.stats.
+    """
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'profile_image', 'intra_id', 'intra_login', 'is_oauth_user', 'is_two_factor_enabled', 'total_games', 'wins', 'losses', 'win_rate', 'rank']
+        read_only_fields = fields
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """
+    Public stats of a ranked player, position is filled in by the view.
+    """
+    position = serializers.SerializerMethodField()
 
-    matchHistory = MatchSerializer(many=True, read_only=True)
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'profile_image', 'intra_id', 'intra_login', 'is_oauth_user', 'is_two_factor_enabled', 'total_games', 'wins', 'losses', 'win_rate', 'rank', 'matchHistory']
-        read_only_fields = ['id', 'intra_id', 'intra_login', 'is_oauth_user', 'is_two_factor_enabled']
+        fields = ['position', 'id', 'username', 'profile_image', 'total_games', 'wins', 'losses', 'win_rate', 'rank']
+        read_only_fields = fields
+
+    def get_position(self, obj):
+        return self.context['positions'][obj.id]
+
+class PlayerModeStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlayerModeStats
+        fields = ['matchType', 'games', 'wins', 'losses', 'win_rate', 'average_margin', 'current_streak', 'best_win_streak']
+        read_only_fields = fields
+
+class OpponentRecordSerializer(serializers.Serializer):
+    opponent = serializers.CharField()
+    opponent_id = serializers.IntegerField(allow_null=True)
+    games = serializers.IntegerField()
+    wins = serializers.IntegerField()
+    losses = serializers.SerializerMethodField()
+    average_margin = serializers.FloatField()
+
+    def get_losses(self, obj):
+        return obj['games'] - obj['wins']
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -28,3 +63,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         validated_data.pop('confirmPassword')
         user = User.objects.create_user(**validated_data)   
         return user
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues tokens carrying the user's token_version for the token/ endpoint.
+    """
+    token_class = VersionedRefreshToken
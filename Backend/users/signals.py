@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after a user's game counters changed through a queryset update(),
+# which bypasses post_save. Receivers get the user_id argument.
+stats_updated = Signal()
@@ -0,0 +1,229 @@
+"""
+Incremental player statistics.
+
+Counters on User and the PlayerModeStats rollups are moved with atomic
+UPDATEs per recorded result instead of being recomputed from the whole match
+history. A match counts for each registered player it is linked to through
+player1_user / player2_user, the same matches Match.objects.for_player
+returns. The reconcile_stats command rebuilds them from scratch if they ever
+drift.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from tournaments.models import Match
+from .models import PlayerModeStats, User
+from .signals import stats_updated
+
+# (wins needed to leave the tier, tier name)
+RANK_TIERS = [
+    (5, "Bronze"),
+    (10, "Silver"),
+    (20, "Gold"),
+    (50, "Platinum"),
+    (100, "Diamond"),
+]
+TOP_RANK = "Master"
+
+
+def rank_for_wins(wins: int) -> str:
+    for threshold, rank in RANK_TIERS:
+        if wins < threshold:
+            return rank
+    return TOP_RANK
+
+
+def rank_expression(wins):
+    """
+    SQL equivalent of rank_for_wins for a wins expression.
+    """
+    return Case(
+        *[When(LessThan(wins, threshold), then=Value(rank)) for threshold, rank in RANK_TIERS],
+        default=Value(TOP_RANK),
+    )
+
+
+def win_rate(wins: int, total_games: int) -> float:
+    return round((wins / total_games) * 100, 2) if total_games > 0 else 0.0
+
+
+def record_results(user_id: int, wins: int, losses: int):
+    """
+    Adds wins and losses to a user's counters in one UPDATE statement.
+    win_rate and rank are derived from the new values in the same statement.
+    :param user_id: id of the user
+    :param wins: number of won games to add
+    :param losses: number of lost games to add
+    """
+    if wins + losses == 0:
+        return
+    new_wins = F('wins') + wins
+    new_total = F('total_games') + wins + losses
+    User.objects.filter(pk=user_id).update(
+        total_games=new_total,
+        wins=new_wins,
+        losses=F('losses') + losses,
+        win_rate=Round(Cast(new_wins, FloatField()) * 100 / new_total, 2),
+        rank=rank_expression(new_wins),
+        updated_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: stats_updated.send(sender=User, user_id=user_id))
+
+
+def outcome(user_id, match):
+    """
+    Result of a match from the point of view of one of its players.
+    The user is player 1 unless they are only linked as player 2.
+    :return: (won, points scored, points conceded)
+    """
+    won = match.winner_user_id == user_id
+    if match.player2_user_id == user_id and match.player1_user_id != user_id:
+        return won, match.player2Score, match.player1Score
+    return won, match.player1Score, match.player2Score
+
+
+def _run_length(outcomes, value, from_end=False):
+    run = 0
+    for won in (reversed(outcomes) if from_end else outcomes):
+        if won != value:
+            break
+        run += 1
+    return run
+
+
+def _longest_win_run(outcomes):
+    best = run = 0
+    for won in outcomes:
+        run = run + 1 if won else 0
+        best = max(best, run)
+    return best
+
+
+def _streak_updates(outcomes):
+    """
+    UPDATE expressions applying a chronological list of results to the
+    current_streak and best_win_streak columns in a single statement.
+    """
+    last = outcomes[-1]
+    sign = 1 if last else -1
+    trailing = _run_length(outcomes, last, from_end=True)
+    if trailing == len(outcomes):
+        # The whole batch extends or replaces the stored streak
+        continues = Q(current_streak__gte=0) if last else Q(current_streak__lte=0)
+        current = Case(When(continues, then=F('current_streak') + sign * trailing), default=Value(sign * trailing))
+    else:
+        current = Value(sign * trailing)
+    leading_wins = _run_length(outcomes, True)
+    joined = Case(When(current_streak__gte=0, then=F('current_streak') + leading_wins), default=Value(leading_wins))
+    best = Greatest(F('best_win_streak'), Value(_longest_win_run(outcomes)), joined)
+    return {'current_streak': current, 'best_win_streak': best}
+
+
+def record_mode_results(user_id: int, matches):
+    """
+    Adds matches to the user's per-mode rollups and to the "all" rollup,
+    with one UPDATE per touched row.
+    :param matches: matches the user played, oldest first
+    """
+    by_mode = defaultdict(list)
+    for match in matches:
+        result = outcome(user_id, match)
+        by_mode[match.matchType].append(result)
+        by_mode[PlayerModeStats.ALL_MODES].append(result)
+    PlayerModeStats.objects.bulk_create(
+        [PlayerModeStats(user_id=user_id, matchType=mode) for mode in by_mode],
+        ignore_conflicts=True,
+    )
+    for mode, results in by_mode.items():
+        outcomes = [won for won, _, _ in results]
+        PlayerModeStats.objects.filter(user_id=user_id, matchType=mode).update(
+            games=F('games') + len(results),
+            wins=F('wins') + sum(outcomes),
+            points_for=F('points_for') + sum(scored for _, scored, _ in results),
+            points_against=F('points_against') + sum(conceded for _, _, conceded in results),
+            **_streak_updates(outcomes),
+        )
+
+
+def rebuild_mode_stats(user):
+    """
+    Recomputes a user's rollups by replaying their whole match history.
+    """
+    rows = {}
+    for match in Match.objects.for_player(user).order_by('created_at', 'id').iterator():
+        won, scored, conceded = outcome(user.pk, match)
+        for mode in (match.matchType, PlayerModeStats.ALL_MODES):
+            row = rows.setdefault(mode, PlayerModeStats(user=user, matchType=mode))
+            row.games += 1
+            row.wins += int(won)
+            row.points_for += scored
+            row.points_against += conceded
+            if won:
+                row.current_streak = row.current_streak + 1 if row.current_streak >= 0 else 1
+                row.best_win_streak = max(row.best_win_streak, row.current_streak)
+            else:
+                row.current_streak = row.current_streak - 1 if row.current_streak <= 0 else -1
+    with transaction.atomic():
+        PlayerModeStats.objects.filter(user=user).delete()
+        PlayerModeStats.objects.bulk_create(rows.values())
+
+
+def opponent_records(user, limit: int = 20):
+    """
+    Record against each opponent, computed with one grouped query over the
+    user's matches. Registered opponents are grouped by their user row under
+    their current username, AI and guest players by name.
+    :return: list of dicts with opponent, opponent_id, games, wins and average_margin
+    """
+    only_player2 = Q(player2_user=user) & ~Q(player1_user=user)
+    opponent_id = Case(When(only_player2, then=F('player1_user')), default=F('player2_user'))
+    opponent = Coalesce(
+        Case(When(only_player2, then=F('player1_user__username')), default=F('player2_user__username')),
+        Case(When(only_player2, then=F('player1Name')), default=F('player2Name')),
+    )
+    margin = Case(
+        When(only_player2, then=F('player2Score') - F('player1Score')),
+        default=F('player1Score') - F('player2Score'),
+    )
+    return list(
+        Match.objects.for_player(user)
+        .annotate(opponent_id=opponent_id, opponent=opponent, margin=margin)
+        .values('opponent_id', 'opponent')
+        .annotate(games=Count('id'), wins=Count('id', filter=Q(winner_user=user)), average_margin=Avg('margin'))
+        .order_by('-games', 'opponent')[:limit]
+    )
+
+
+def match_players(match) -> set:
+    """
+    :return: ids of the registered players of a match
+    """
+    return {user_id for user_id in (match.player1_user_id, match.player2_user_id) if user_id is not None}
+
+
+def record_matches(matches):
+    """
+    Counts just inserted matches for each of their registered players,
+    with one set of UPDATEs per player for the whole batch.
+    :param matches: saved matches, oldest first
+    """
+    by_player = defaultdict(list)
+    for match in matches:
+        for user_id in match_players(match):
+            by_player[user_id].append(match)
+    for user_id, played in by_player.items():
+        wins = sum(1 for match in played if match.winner_user_id == user_id)
+        record_results(user_id, wins=wins, losses=len(played) - wins)
+        record_mode_results(user_id, played)
+
+
+def record_match(match):
+    """
+    Counts a match that was just played.
+    """
+    record_matches([match])
@@ -0,0 +1,25 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claim holding User.token_version at the time the token was issued
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+class VersionedRefreshToken(RefreshToken):
+    """
+    Refresh token stamped with the user's token_version.
+    The claim is copied into every access token derived from it, so bumping
+    User.token_version invalidates all of them at once.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+def token_version_of(token) -> int:
+    """
+    Tokens issued before versioning was introduced count as version 0.
+    """
+    return token.get(TOKEN_VERSION_CLAIM, 0)
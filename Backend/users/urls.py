@@ -1,19 +1,26 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .views import (
-    RegisterView, LoginView, UserDetailView, LogoutView,
+    RegisterView, LoginView, UserDetailView, MatchHistoryView, PlayerStatsView, LogoutView, LogoutAllView,
     FortyTwoLoginView, FortyTwoCallbackView,
     Setup2FAView, Verify2FAView, Disable2FAView,
-    CookieTokenRefreshView)
+    CookieTokenRefreshView, LeaderboardView, LeaderboardAroundMeView)
 
 urlpatterns = [
     # User endpoints
     path('me/', UserDetailView.as_view(), name='user-detail'),
+    path('me/matches/', MatchHistoryView.as_view(), name='user-matches'),
+    path('me/stats/', PlayerStatsView.as_view(), name='user-stats'),
+
+    # leaderboard endpoints
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', LeaderboardAroundMeView.as_view(), name='leaderboard-me'),
     
     # login/logout endpoints
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('logout/all/', LogoutAllView.as_view(), name='logout-all'),
 
     # token endpoints
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
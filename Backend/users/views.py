@@ -5,10 +5,19 @@ from .authentication import JWTCookieAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken, BlacklistMixin
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenRefreshView
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 from django.contrib.auth import authenticate
-from .serializers import UserSerializer, RegisterSerializer
-from .models import User, RevokedAccessToken
+from .serializers import (UserSerializer, RegisterSerializer, LeaderboardEntrySerializer,
+    PlayerModeStatsSerializer, OpponentRecordSerializer)
+from .pagination import MatchCursorPagination
+from .leaderboard import leaderboard
+from .stats import opponent_records
+from tournaments.models import Match
+from tournaments.serializers import MatchSerializer
+from .models import User, PlayerModeStats
+from .revocation import revocation_list
+from .tokens import VersionedRefreshToken, token_version_of
 import requests
 import os
 import secrets
@@ -20,7 +29,6 @@ import io
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django.shortcuts import get_object_or_404, redirect
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
-from tournaments.block import get_tournaments
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -31,8 +39,9 @@ class LoginView(APIView):
     """
     View for user login
     post request with username and password
-    returns access and refresh tokens
-    cookies are set with HttpOnly and Secure flags
+    returns the user's identity and summary stats only, match history and
+    tournaments are fetched lazily from their own endpoints
+    access and refresh tokens are set as cookies with HttpOnly and Secure flags
     """
     permission_classes = [permissions.AllowAny]
     
@@ -43,15 +52,13 @@ class LoginView(APIView):
         user = authenticate(username=username, password=password)
         if not user:
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
-        user.update_stats()
-        refresh = RefreshToken.for_user(user)
+        refresh = VersionedRefreshToken.for_user(user)
         access_token_str = str(refresh.access_token)
         refresh_token_str = str(refresh)
         response = Response({
             'user': UserSerializer(user).data,
             'success': True
         })
-        response.data['user']['tournaments'] = get_tournaments(user.username)
         response.set_cookie(key='access_token', value=access_token_str, httponly=True, secure=True, samesite='Lax', max_age=60 * 30)
         response.set_cookie(key='refresh_token', value=refresh_token_str, httponly=True, secure=True, samesite='Lax', max_age=60 * 60 * 24)
         return response
@@ -168,7 +175,7 @@ class UserDetailView(generics.RetrieveAPIView):
     """
     View for user details
     get request with user credentials
-    returns user details
+    returns user details and summary stats
     """
     authentication_classes = [JWTCookieAuthentication]
     permission_classes = [permissions.IsAuthenticated]
@@ -177,13 +184,109 @@ class UserDetailView(generics.RetrieveAPIView):
     
     def get(self, request):
         user = self.request.user
-        response = Response({
+        return Response({
             'user': UserSerializer(user).data,
             'status': 'success',
             'success': True
         })
-        response.data['user']['tournaments'] = get_tournaments(user.username)
-        return response
+
+class MatchHistoryView(generics.ListAPIView):
+    """
+    View for the user's match history
+    get request with user credentials, optional matchType and opponent filters
+    returns one page of the matches the user played, newest first, and the link to the next page
+    """
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = MatchSerializer
+    pagination_class = MatchCursorPagination
+
+    def get_player(self):
+        return self.request.user
+
+    def get_queryset(self):
+        queryset = Match.objects.all()
+        match_type = self.request.query_params.get('matchType')
+        if match_type:
+            queryset = queryset.filter(matchType=match_type)
+        opponent = self.request.query_params.get('opponent')
+        if opponent:
+            queryset = queryset.against(self.request.user, opponent)
+        return queryset
+
+class PlayerStatsView(APIView):
+    """
+    View for the user's detailed stats
+    get request with optional opponents limit
+    returns overall and per match type results from the rollups
+    and the record against each opponent
+    """
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    max_opponents = 100
+
+    def get(self, request):
+        try:
+            limit = min(self.max_opponents, max(1, int(request.query_params.get('opponents', 20))))
+        except ValueError:
+            return Response({'error': 'opponents must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        rollups = {row.matchType: row for row in PlayerModeStats.objects.filter(user=request.user)}
+        overall = rollups.pop(PlayerModeStats.ALL_MODES, PlayerModeStats(user=request.user, matchType=PlayerModeStats.ALL_MODES))
+        return Response({
+            'overall': PlayerModeStatsSerializer(overall).data,
+            'modes': PlayerModeStatsSerializer(sorted(rollups.values(), key=lambda row: row.matchType), many=True).data,
+            'opponents': OpponentRecordSerializer(opponent_records(request.user, limit), many=True).data,
+        })
+
+def leaderboard_entries(ranked):
+    """
+    Loads the users of a list of (position, user_id) in one query, keeping the order.
+    """
+    positions = {user_id: position for position, user_id in ranked}
+    users = User.objects.in_bulk(list(positions))
+    ordered = [users[user_id] for _, user_id in ranked if user_id in users]
+    return LeaderboardEntrySerializer(ordered, many=True, context={'positions': positions}).data
+
+class LeaderboardView(APIView):
+    """
+    View for the leaderboard
+    get request with optional offset and limit
+    returns players ordered by win rate then wins
+    """
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request):
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = min(self.max_limit, max(1, int(request.query_params.get('limit', self.max_limit))))
+        except ValueError:
+            return Response({'error': 'offset and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'count': leaderboard.count(),
+            'results': leaderboard_entries(leaderboard.top(offset, limit))
+        })
+
+class LeaderboardAroundMeView(APIView):
+    """
+    View for the user's leaderboard neighbourhood
+    get request with optional radius
+    returns the user's position and the players ranked around them
+    """
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    max_radius = 50
+
+    def get(self, request):
+        try:
+            radius = min(self.max_radius, max(0, int(request.query_params.get('radius', 5))))
+        except ValueError:
+            return Response({'error': 'radius must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'position': leaderboard.position(request.user.id),
+            'results': leaderboard_entries(leaderboard.around(request.user.id, radius))
+        })
 
 class FortyTwoLoginView(APIView):
     """
@@ -265,12 +368,11 @@ class FortyTwoCallbackView(APIView):
                     is_oauth_user=True,
                     profile_image=profile_data.get('image', {}).get('link', '')
                 )
-            refresh = RefreshToken.for_user(user) # Generate JWT tokens for the user
+            refresh = VersionedRefreshToken.for_user(user) # Generate JWT tokens for the user
             access_token = str(refresh.access_token) # from refresh token we get access token
             refresh_token = str(refresh) # from refresh token we get refresh token
             frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000') # Get the frontend URL from environment
             redirect_url = f"{frontend_url}/oauth/callback.html?access_token={access_token}&refresh_token={refresh_token}"
-            user.update_stats()
             return redirect(redirect_url)
         except requests.exceptions.RequestException as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -290,10 +392,10 @@ class LogoutView(APIView):
         refresh_token_string = request.COOKIES.get('refresh_token')
         if access_token_string:
             try:
-                RevokedAccessToken.objects.get_or_create(
-                    token=access_token_string,
-                    user=request.user
-                ) # Store the access token in the blacklist
+                token = AccessToken(access_token_string)
+                revocation_list.revoke(token['jti'], token['exp'], user=request.user) # Store the access token's jti in the blacklist
+            except TokenError:
+                pass
             except Exception:
                 pass
         if refresh_token_string:
@@ -310,6 +412,24 @@ class LogoutView(APIView):
         return response
 
 
+class LogoutAllView(APIView):
+    """
+    View for logging out of every session
+    post request with user credentials
+    bumps the user's token version so every token issued so far is rejected
+    returns success message
+    """
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        request.user.revoke_all_tokens()
+        response = Response({'success': True, 'message': 'Logged out of all sessions successfully'}, status=status.HTTP_200_OK)
+        response.delete_cookie('access_token')
+        response.delete_cookie('refresh_token')
+        return response
+
+
 class CookieTokenRefreshView(APIView):
     """
     View for token refresh
@@ -325,6 +445,10 @@ class CookieTokenRefreshView(APIView):
         
         try:
             refresh = RefreshToken(refresh_token)
+            user_id = refresh[api_settings.USER_ID_CLAIM]
+            current_version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+            if current_version is None or token_version_of(refresh) != current_version:
+                return Response({"error": "Refresh token has been revoked"}, status=status.HTTP_401_UNAUTHORIZED)
             response = Response({
                 'success': True,
                 'message': 'Token refreshed successfully'
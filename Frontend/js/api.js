@@ -183,6 +183,60 @@ class API {
     }
   }
  
+  async getMatchHistory(nextUrl = null, retryCount = 0) {
+    try {
+      const response = await fetch(nextUrl || ENDPOINTS.user.matches, {
+        method: 'GET',
+        credentials: 'include'
+      });
+      if (response.status === 401 && retryCount < 1) {
+        const refreshResult = await this.refreshToken();
+        if (refreshResult.success) {
+          return await this.getMatchHistory(nextUrl, retryCount + 1);
+        } else {
+          console.error('Token refresh failed:', refreshResult.error);
+          utils.cleanUp();
+          return { success: false, error: 'Authentication expired. Please log in again.', authExpired: true };
+        }
+      }
+      if (!response.ok) {
+        throw new Error(`Failed to fetch match history: ${response.status}`);
+      }
+      const data = await response.json();
+      return { success: true, matches: data.results, next: data.next };
+    } catch (error) {
+      console.error(`getMatchHistory error (attempt ${retryCount + 1}):`, error);
+      return { success: false, error: error.message };
+    }
+  }
+
+  async getTournaments(retryCount = 0) {
+    try {
+      const response = await fetch(ENDPOINTS.game.tournamentList, {
+        method: 'GET',
+        credentials: 'include'
+      });
+      if (response.status === 401 && retryCount < 1) {
+        const refreshResult = await this.refreshToken();
+        if (refreshResult.success) {
+          return await this.getTournaments(retryCount + 1);
+        } else {
+          console.error('Token refresh failed:', refreshResult.error);
+          utils.cleanUp();
+          return { success: false, error: 'Authentication expired. Please log in again.', authExpired: true };
+        }
+      }
+      if (!response.ok) {
+        throw new Error(`Failed to fetch tournaments: ${response.status}`);
+      }
+      const tournaments = await response.json();
+      return { success: true, tournaments };
+    } catch (error) {
+      console.error(`getTournaments error (attempt ${retryCount + 1}):`, error);
+      return { success: false, error: error.message };
+    }
+  }
+ 
   async refreshToken() {
     try {
       const refreshEndpoint = ENDPOINTS.auth.refreshToken;
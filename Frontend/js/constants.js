@@ -24,9 +24,11 @@ export const ENDPOINTS = {
     },
     user: {
         me: '/api/users/me/',
+        matches: '/api/users/me/matches/',
     },
     game: {
         tournament: '/api/tournaments/tournament/',
+        tournamentList: '/api/tournaments/tournament/list/',
         // match_history: '/api/tournaments/match_history/',
         match: '/api/tournaments/match/',
     },
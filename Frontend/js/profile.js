@@ -354,7 +354,7 @@ class Profile {
         }
     }
 
-    renderMatchHistory() {
+    async renderMatchHistory() {
         const tableBody = document.getElementById('matchHistoryTable');
         const tableHead = tableBody.closest('table').querySelector('thead');
 
@@ -365,45 +365,75 @@ class Profile {
             <th>Winner</th>
         </tr>`;
 
+        // Match history and tournaments are not part of the user payload, fetch them lazily
+        const [historyResult, tournamentsResult] = await Promise.all([
+            api.getMatchHistory(),
+            api.getTournaments()
+        ]);
+
         const currentUser = app.getUsername();
-        const history = app.state.user.matchHistory || [];
+        const history = historyResult.success ? historyResult.matches : [];
         const entries = utils.extractMatchData(history, currentUser);
 
         tableBody.innerHTML = '';
         if (entries.length === 0) {
             tableBody.innerHTML = `<tr><td colspan="4" class="text-center">No match history available</td></tr>`;
         } else {
-            entries.forEach(entry => {
-                const tr = document.createElement('tr');
-                if (entry.winner === currentUser) {
-                    tr.classList.add('match-win');
-                } else {
-                    tr.classList.add('match-loss');
-                }
-                tr.innerHTML = `
-                    <td>${entry.type}</td>
-                    <td>${entry.vs}</td>
-                    <td>${entry.score}</td>
-                    <td>${entry.winner}</td>
-                `;
-                tableBody.appendChild(tr);
-            });
+            this.appendMatchRows(tableBody, entries, currentUser);
         }
+        if (historyResult.success && historyResult.next)
+            this.appendLoadMoreRow(tableBody, historyResult.next);
         // Render tournaments after match history
-        this.renderTournamentMatches(tableBody);
+        this.renderTournamentMatches(tableBody, tournamentsResult.success ? tournamentsResult.tournaments : []);
+    }
+
+    appendMatchRows(tableBody, entries, currentUser, beforeRow = null) {
+        entries.forEach(entry => {
+            const tr = document.createElement('tr');
+            if (entry.winner === currentUser) {
+                tr.classList.add('match-win');
+            } else {
+                tr.classList.add('match-loss');
+            }
+            tr.innerHTML = `
+                <td>${entry.type}</td>
+                <td>${entry.vs}</td>
+                <td>${entry.score}</td>
+                <td>${entry.winner}</td>
+            `;
+            tableBody.insertBefore(tr, beforeRow);
+        });
+    }
+
+    // "Load more" row fetching the next page of match history in place
+    appendLoadMoreRow(tableBody, nextUrl, beforeRow = null) {
+        const tr = document.createElement('tr');
+        tr.innerHTML = `<td colspan="4" class="text-center"><button type="button" class="btn btn-outline-gold btn-sm">Load more</button></td>`;
+        tr.querySelector('button').addEventListener('click', async () => {
+            const result = await api.getMatchHistory(nextUrl);
+            if (!result.success) {
+                components.showToast('error', 'Match History Error', 'Could not load more matches.');
+                return;
+            }
+            const currentUser = app.getUsername();
+            this.appendMatchRows(tableBody, utils.extractMatchData(result.matches, currentUser), currentUser, tr);
+            if (result.next)
+                this.appendLoadMoreRow(tableBody, result.next, tr);
+            tr.remove();
+        });
+        tableBody.insertBefore(tr, beforeRow);
     }
 
     // Render tournament matches grouped with a blank separator before each
-    renderTournamentMatches(tableBody) {
+    renderTournamentMatches(tableBody, tournaments) {
         const currentUser = app.getUsername();
-        const tournaments = app.state.user.tournaments || [];
         tournaments.forEach(tournament => {
             // Tournament summary row (ID and winner)
             const summary = document.createElement('tr');
             summary.classList.add('table-warning');
             summary.innerHTML = `
                 <td colspan="4" class="text-center fw-bold">
-                    Tournament #${tournament.tournament_id} — Winner: ${tournament.winner}
+                    Tournament #${tournament.tournament_id ?? tournament.id} — Winner: ${tournament.winner}
                 </td>`;
             tableBody.appendChild(summary);
             // Add each tournament match